@@ -1,4 +1,7 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from responses import respond
+from metrics import metrics, MetricsMiddleware, CONTENT_TYPE, METRICS_ENABLED
 from repository import TasksRepository, Task
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -15,6 +18,10 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
+# outermost, so CORS preflights and routing are part of the measured latency
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # repository
 repository = TasksRepository()
 
@@ -24,19 +31,46 @@ def root():
     return {"message": "Hello World"}
 
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text format, empty when METRICS_ENABLED is off."""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+
+def stream_tasks(after_id=None, page_size=1000):
+    """Yields every task as NDJSON, walking the repository page by page."""
+    while True:
+        page = repository.get_all(limit=page_size, after_id=after_id)
+        for task in page:
+            yield task.model_dump_json() + "\n"
+        if len(page) < page_size:
+            return
+        after_id = page[-1].id
+
+
 @app.get("/tasks")
-def get_tasks():
-    return {"tasks": repository.get_all()}
+def get_tasks(limit: int = Query(100, ge=1, le=1000), after_id: int | None = None, format: str = "json"):
+    # format=ndjson streams a full export starting after `after_id`
+    if format == "ndjson":
+        return StreamingResponse(stream_tasks(after_id), media_type="application/x-ndjson")
+    tasks = repository.get_all(limit=limit, after_id=after_id)
+    next_after_id = tasks[-1].id if len(tasks) == limit else None
+    return respond({"tasks": tasks, "next_after_id": next_after_id})
 
 
 @app.post("/tasks")
 def add_task(new_task: Task):
-    repository.save(new_task)
-    return {"message": repository.get_all()}
+    try:
+        repository.save(new_task)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"task": new_task}
     
 
 @app.post("/tasks/{id}/")
 def update_task_status(id: int):
-    item = repository.get_by_id(id)
-    item.status = not (item.status)
+    # a single repository operation, a read then a write could lose parallel toggles
+    item = repository.toggle_status(id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Task not found")
     return {"task": item}
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+Latency metrics in Prometheus text format.
+
+MetricsMiddleware records a histogram of request latency per route plus the
+number of requests in flight, time_methods wraps the repository operations
+of a class (REPOSITORY_METHODS) to record call latency. Both are only
+installed when METRICS_ENABLED is on, when it's off nothing is wrapped and
+the only cost left is an empty /metrics page.
+"""
+import bisect
+import functools
+import inspect
+import os
+import threading
+import time
+
+# METRICS_ENABLED=0 leaves routes and repositories unwrapped
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# The operations handlers call. Helpers such as write_status are left out, they
+# would add series repeating what the calling operation already records.
+REPOSITORY_METHODS = frozenset({
+    "get_all", "get_by_id", "get_by_status", "save", "set_status", "toggle_status",
+})
+
+# seconds, upper bounds of the histogram buckets (+Inf is implied)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # counts per bucket, made cumulative when rendered; the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Histograms and gauges keyed by (name, labels), labels being a tuple of pairs."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.gauges = {}
+        self.help = {}
+        # repository calls are observed from the threadpool
+        self.lock = threading.Lock()
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels=(), value=1):
+        with self.lock:
+            self.gauges[(name, labels)] = self.gauges.get((name, labels), 0) + value
+
+    def dec(self, name, labels=(), value=1):
+        self.inc(name, labels, -value)
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.gauges.clear()
+
+    def render(self):
+        with self.lock:
+            histograms = {key: (list(x.counts), x.sum, x.count) for key, x in self.histograms.items()}
+            gauges = dict(self.gauges)
+        lines = []
+        for name in sorted({name for name, _ in histograms}):
+            lines += header(name, "histogram", self.help.get(name))
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', format_bound(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {total}")
+                lines.append(f"{name}_count{format_labels(labels)} {count}")
+        for name in sorted({name for name, _ in gauges}):
+            lines += header(name, "gauge", self.help.get(name))
+            for (metric, labels), value in sorted(gauges.items()):
+                if metric == name:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def header(name, kind, text):
+    return ([f"# HELP {name} {text}"] if text else []) + [f"# TYPE {name} {kind}"]
+
+def format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()
+metrics.describe("http_request_duration_seconds", "Request latency by route, including streamed bodies.")
+metrics.describe("http_requests_in_flight", "Requests currently being handled.")
+metrics.describe("repository_call_duration_seconds", "Latency of repository method calls.")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware, cheaper than BaseHTTPMiddleware. The route label is
+    the matched path template (/customers/{id}) so ids don't blow up the
+    number of series; requests that match no route are labelled "unmatched".
+    """
+
+    def __init__(self, app, registry=metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.registry.inc("http_requests_in_flight")
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.registry.dec("http_requests_in_flight")
+            route = scope.get("route")
+            labels = (("method", scope["method"]), ("route", getattr(route, "path", "unmatched")), ("status", status))
+            self.registry.observe("http_request_duration_seconds", labels, elapsed)
+
+
+def timed(function, registry=metrics):
+    """Records each call of a repository method, labelled with the concrete class."""
+    name = function.__name__
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await function(self, *args, **kwargs)
+            finally:
+                registry.observe("repository_call_duration_seconds", (("repository", type(self).__name__), ("method", name)), time.perf_counter() - start)
+    else:
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(self, *args, **kwargs)
+            finally:
+                registry.observe("repository_call_duration_seconds", (("repository", type(self).__name__), ("method", name)), time.perf_counter() - start)
+    wrapper.__timed__ = True
+    return wrapper
+
+
+def time_methods(cls, enabled=None, methods=REPOSITORY_METHODS):
+    """
+    Class decorator wrapping the methods named in `methods` defined on cls with timed.
+    Generators are left alone since timing them would only measure their creation.
+    """
+    if not (METRICS_ENABLED if enabled is None else enabled):
+        return cls
+    for attr, value in list(vars(cls).items()):
+        if attr not in methods or not inspect.isfunction(value) or getattr(value, "__timed__", False):
+            continue
+        if inspect.isgeneratorfunction(value) or inspect.isasyncgenfunction(value):
+            continue
+        setattr(cls, attr, timed(value))
+    return cls
@@ -1,33 +1,88 @@
-
+import bisect
+import threading
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List
 from pydantic import BaseModel
 
+from metrics import time_methods
+
 
 class Task(BaseModel):
     id : int
     name: str
     status: bool
-    
-    
+
+
+@time_methods
 class TasksRepository:
-    tasks: List[str]
-    
+    """Shared by the threadpool: writers are serialized by a lock, readers never lock."""
+    # primary index id -> task, dicts keep insertion order so get_all is stable
+    tasks: Dict[int, Task]
+    # secondary index status -> ids (dict used as an insertion-ordered set)
+    tasks_by_status: Dict[bool, Dict[int, None]]
+    # ids kept sorted for keyset pagination
+    sorted_ids: List[int]
+
     def __init__(self):
-        self.tasks = [
-            Task(id=1,name="My first task", status=False), 
-            Task(id=2,name="My second task",status=False), 
+        self.lock = threading.Lock()
+        self.tasks = {}
+        self.tasks_by_status = {True: {}, False: {}}
+        self.sorted_ids = []
+        for task in [
+            Task(id=1,name="My first task", status=False),
+            Task(id=2,name="My second task",status=False),
             Task(id=3,name="My third task", status=False)
-        ]
+        ]:
+            self.save(task)
+
+    def get_all(self, limit=None, after_id=None):
+        # without limit/after_id returns everything in insertion order,
+        # otherwise one page ordered by id starting after `after_id`
+        if limit is None and after_id is None:
+            return list(self.tasks.values())
+        start = 0 if after_id is None else bisect.bisect_right(self.sorted_ids, after_id)
+        while True:
+            ids = self.sorted_ids[start:None if limit is None else start + limit]
+            # smaller ids inserted since the bisect shift the list right, step past them
+            skip = 0 if after_id is None else bisect.bisect_right(ids, after_id)
+            if not skip:
+                return [self.tasks[x] for x in ids]
+            start += skip
 
-    def get_all(self):
-        return self.tasks
-    
     def save(self, task: Task):
-        self.tasks.append(task)
+        with self.lock:
+            if task.id in self.tasks:
+                raise ValueError(f"Task with id {task.id} already exists")
+            self.tasks[task.id] = task
+            self.tasks_by_status[task.status][task.id] = None
+            bisect.insort(self.sorted_ids, task.id)
 
     def get_by_id(self, id):
-        for x in self.tasks:
-            if x.id == id:
-                return x
-        return None
\ No newline at end of file
+        return self.tasks.get(id)
+
+    def get_by_status(self, status: bool):
+        ids = list(self.tasks_by_status[status])
+        # a task may have changed status since the copy, those are left out
+        return [task for task in map(self.tasks.__getitem__, ids) if task.status == status]
+
+    def set_status(self, id, status: bool):
+        with self.lock:
+            return self.write_status(id, lambda task: status)
+
+    def toggle_status(self, id):
+        # read and flip under one lock, parallel toggles are never lost
+        with self.lock:
+            return self.write_status(id, lambda task: not task.status)
+
+    def write_status(self, id, new_status):
+        # caller holds the lock
+        task = self.tasks.get(id)
+        if task is None:
+            return None
+        status = new_status(task)
+        updated = task.model_copy(update={"status": status})
+        self.tasks[id] = updated
+        if status != task.status:
+            self.tasks_by_status[status][id] = None
+            del self.tasks_by_status[task.status][id]
+        return updated
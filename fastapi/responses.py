@@ -0,0 +1,29 @@
+"""
+Opt-in fast JSON responses.
+
+FastAPI runs jsonable_encoder over any dict a handler returns, which walks
+every item generically. A handler that returns FastJSONResponse skips that:
+content is encoded by orjson and pydantic models go through their prebuilt
+core serializer.
+"""
+import os
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# encode list responses with orjson, opt-in with FAST_JSON_RESPONSES=1
+FAST_JSON_RESPONSES = os.environ.get("FAST_JSON_RESPONSES", "0") == "1"
+
+def encode_default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.__pydantic_serializer__.to_python(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=encode_default)
+
+def respond(content):
+    """Returns content as a FastJSONResponse when FAST_JSON_RESPONSES is on."""
+    return FastJSONResponse(content) if FAST_JSON_RESPONSES else content
@@ -0,0 +1,76 @@
+"""
+Collector throughput against the local OpenWeather stand-in: cities per
+second, share of the quota used and time to completion for growing catalogs.
+Nothing leaves the machine and no database is needed.
+
+    python benchmark_collector.py
+    python benchmark_collector.py --sizes 100 1000 --max-calls 60 --period 1 --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+for var in ['DATABASE_NAME', 'DATABASE_USER', 'DATABASE_PASSWORD', 'DATABASE_HOST', 'DATABASE_PORT']:
+    os.environ.setdefault(var, '')
+os.environ.setdefault('DATABASE_ENGINE', 'django.db.backends.sqlite3')
+os.environ.setdefault('OPEN_WEATHER_API_KEY', 'standin')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather.settings')
+
+import django
+django.setup()
+
+from collector import views
+from collector.catalog import CityCatalog
+from collector.ratelimit import SlidingWindowLimiter
+from collector.readings import ReadingCache
+from collector.standin import OpenWeatherStandIn, start
+
+
+async def bench(size, args, directory):
+    path = os.path.join(directory, f'city_ids_{size}.json')
+    with open(path, 'w') as f:
+        json.dump({'ids': list(range(1, size + 1))}, f)
+    views.city_catalog = CityCatalog(path)
+    views.reading_cache = ReadingCache()
+
+    standin = OpenWeatherStandIn(args.latency, args.jitter, args.error_rate, args.max_calls, args.period, seed=size)
+    runner, views.OPEN_WEATHER_BASE_URL = await start(standin)
+    limiter = SlidingWindowLimiter(args.max_calls, args.period)
+    try:
+        started = time.perf_counter()
+        await views.gather_weather_info(size, limiter=limiter, concurrency=args.concurrency)
+        elapsed = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+
+    results = views.get_cache_current_results(size)
+    views.reset_cache(size)
+    failed = sum('error' in x for x in results)
+    # calls made against the most the quota allowed in that time
+    quota_use = standin.stats['calls'] / (args.max_calls * max(1.0, elapsed / args.period))
+    return elapsed, size / elapsed, standin.stats, failed, quota_use
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--max-calls', type=int, default=1000, help='quota enforced by the stand-in and the limiter')
+    parser.add_argument('--period', type=float, default=1.0)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int, default=views.OPEN_WEATHER_MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    print(f"{'cities':>8} {'seconds':>9} {'cities/s':>10} {'calls':>7} {'429s':>6} {'500s':>6} {'failed':>7} {'quota use':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            elapsed, rate, stats, failed, quota_use = await bench(size, args, directory)
+            print(f"{size:>8} {elapsed:>9.2f} {rate:>10.1f} {stats['calls']:>7} {stats['throttled']:>6} {stats['errors']:>6} {failed:>7} {quota_use:>10.0%}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+import json
+import os
+import sys
+import threading
+from array import array
+from pathlib import Path
+
+# binary catalog: this header then the ids as little-endian signed 64-bit ints
+BINARY_HEADER = b'CITYIDS1'
+
+
+class CityCatalog:
+    """
+    City ids of a catalog file, loaded once into an array of int64 (8 bytes per
+    id instead of a Python int object each) and loaded again only when the
+    file's mtime changes.
+
+    Two formats, picked by suffix: the JSON file ({"ids": [...]}) and a
+    binary .bin file (see write_binary_catalog) that loads without any
+    parsing, for catalogs of tens of thousands of cities.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.city_ids = array('q')
+        self.loads = 0
+
+    def ids(self):
+        """The current ids. Shared by every caller, don't modify it."""
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self.mtime:
+            with self.lock:
+                if mtime != self.mtime:
+                    self.city_ids = read_catalog(self.path)
+                    self.mtime = mtime
+                    self.loads += 1
+        return self.city_ids
+
+    def count(self):
+        return len(self.ids())
+
+
+def read_catalog(path):
+    path = Path(path)
+    if path.suffix == '.bin':
+        with open(path, 'rb') as f:
+            if f.read(len(BINARY_HEADER)) != BINARY_HEADER:
+                raise ValueError(f'{path} is not a binary city catalog')
+            ids = array('q', f.read())
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        return ids
+    with open(path) as f:
+        return array('q', json.load(f)['ids'])
+
+
+def write_binary_catalog(ids, path):
+    ids = array('q', ids)
+    if sys.byteorder == 'big':
+        ids.byteswap()
+    with open(path, 'wb') as f:
+        f.write(BINARY_HEADER)
+        ids.tofile(f)
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class JobRunnerFull(Exception):
+    pass
+
+
+class JobExists(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, id):
+        self.id = id
+        self.status = 'queued' # queued -> running -> done | failed
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobRunner:
+    """
+    Runs coroutines as background jobs on one event loop in a daemon thread,
+    so a request only has to submit the job and return.
+
+    At most `max_running` jobs run at once, the rest wait as queued; past
+    `max_queued` waiting jobs submit raises JobRunnerFull. Job state lives in
+    this process only and is lost on restart. The last `keep_finished`
+    finished jobs are kept for status queries.
+    """
+
+    def __init__(self, max_running=2, max_queued=20, keep_finished=1000):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        # created on the runner loop, asyncio primitives bind to a loop on 3.8
+        self.slots = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self.loop.run_forever, name='collection-jobs', daemon=True)
+                self.thread.start()
+
+    def submit(self, id, coroutine_function, *args):
+        """Schedules coroutine_function(*args) as job `id` and returns the Job."""
+        self.start()
+        with self.lock:
+            existing = self.jobs.get(id)
+            if existing is not None and not existing.finished:
+                raise JobExists(f'job {id} is {existing.status}')
+            if sum(not x.finished for x in self.jobs.values()) >= self.max_running + self.max_queued:
+                raise JobRunnerFull('too many collection requests in progress')
+            job = self.jobs[id] = Job(id)
+            self.jobs.move_to_end(id)
+            self.prune()
+        job.future = asyncio.run_coroutine_threadsafe(self.run(job, coroutine_function, *args), self.loop)
+        return job
+
+    async def run(self, job, coroutine_function, *args):
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_running)
+        async with self.slots:
+            job.status = 'running'
+            job.started_at = time.time()
+            try:
+                await coroutine_function(*args)
+            except Exception as e:
+                job.status = 'failed'
+                job.error = f'{type(e).__name__}: {e}'
+            else:
+                job.status = 'done'
+            finally:
+                job.finished_at = time.time()
+
+    def get(self, id):
+        with self.lock:
+            return self.jobs.get(id)
+
+    def wait(self, id, timeout=None):
+        """Blocks until job `id` finishes, for tests and scripts."""
+        job = self.get(id)
+        job.future.result(timeout)
+        return job
+
+    def prune(self):
+        # caller holds the lock
+        finished = [x.id for x in self.jobs.values() if x.finished]
+        for id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[id]
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from collector.catalog import read_catalog, write_binary_catalog
+from weather.settings import CITY_IDS_FP
+
+
+class Command(BaseCommand):
+    help = 'Converts a JSON city id catalog into the binary format (point CITY_IDS_FP at the .bin file to use it)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='path of the .bin catalog to write')
+        parser.add_argument('--source', default=str(CITY_IDS_FP), help='JSON catalog to convert')
+
+    def handle(self, *args, **options):
+        if not options['output'].endswith('.bin'):
+            self.stderr.write('output must end in .bin')
+            return
+        ids = read_catalog(options['source'])
+        write_binary_catalog(ids, options['output'])
+        self.stdout.write(f"Wrote {len(ids)} city ids to {options['output']}")
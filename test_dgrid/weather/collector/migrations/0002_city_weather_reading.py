@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CityWeatherReading',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('city_id', models.BigIntegerField()),
+                ('temperature', models.FloatField(null=True)),
+                ('humidity', models.IntegerField(null=True)),
+                ('error', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('collection_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='collector.collectionrequest')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='cityweatherreading',
+            index=models.Index(fields=['collection_request', 'city_id'], name='collector_c_collect_130199_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cityweatherreading',
+            index=models.Index(fields=['city_id', 'created_at'], name='collector_c_city_id_8cf189_idx'),
+        ),
+    ]
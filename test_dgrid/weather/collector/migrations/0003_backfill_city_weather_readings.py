@@ -0,0 +1,51 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def blobs_to_readings(apps, schema_editor):
+    """One CityWeatherReading per item of every city_weather_info list, dated like its request."""
+    CollectionRequest = apps.get_model('collector', 'CollectionRequest')
+    CityWeatherReading = apps.get_model('collector', 'CityWeatherReading')
+    batch = []
+    for cr in CollectionRequest.objects.only('id', 'created_at', 'city_weather_info').iterator():
+        if not isinstance(cr.city_weather_info, list):
+            continue # default {} of a request that was never filled
+        for item in cr.city_weather_info:
+            batch.append(CityWeatherReading(
+                collection_request_id=cr.id,
+                city_id=item['city_id'],
+                temperature=item.get('temperature'),
+                humidity=item.get('humidity'),
+                error=item['error'][:255] if item.get('error') else None,
+                created_at=cr.created_at,
+            ))
+            if len(batch) >= BATCH_SIZE:
+                CityWeatherReading.objects.bulk_create(batch)
+                batch = []
+    CityWeatherReading.objects.bulk_create(batch)
+
+
+def readings_to_blobs(apps, schema_editor):
+    CollectionRequest = apps.get_model('collector', 'CollectionRequest')
+    CityWeatherReading = apps.get_model('collector', 'CityWeatherReading')
+    blobs = {}
+    for reading in CityWeatherReading.objects.order_by('id').iterator():
+        item = {'city_id': reading.city_id, 'temperature': reading.temperature, 'humidity': reading.humidity}
+        if reading.error is not None:
+            item['error'] = reading.error
+        blobs.setdefault(reading.collection_request_id, []).append(item)
+    for id, blob in blobs.items():
+        CollectionRequest.objects.filter(id=id).update(city_weather_info=blob)
+    CityWeatherReading.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0002_city_weather_reading'),
+    ]
+
+    operations = [
+        migrations.RunPython(blobs_to_readings, readings_to_blobs),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0003_backfill_city_weather_readings'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='collectionrequest',
+            name='city_weather_info',
+        ),
+    ]
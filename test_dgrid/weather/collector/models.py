@@ -1,7 +1,45 @@
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 class CollectionRequest(models.Model):    
     id = models.BigIntegerField(primary_key=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    city_weather_info = models.JSONField(default=dict)
+    # collected readings are CityWeatherReading rows, cr.readings
+
+
+class CityWeatherReading(models.Model):
+    """One city's reading in a collection request, rows keep the order the cities were collected in."""
+    id = models.BigAutoField(primary_key=True)
+    collection_request = models.ForeignKey(CollectionRequest, on_delete=models.CASCADE, related_name='readings')
+    city_id = models.BigIntegerField()
+    temperature = models.FloatField(null=True)
+    humidity = models.IntegerField(null=True)
+    # set when the city couldn't be fetched, temperature and humidity are null then
+    error = models.CharField(max_length=255, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['collection_request', 'city_id']),
+            models.Index(fields=['city_id', 'created_at']),
+        ]
+
+    @classmethod
+    def from_item(cls, collection_request_id, item, created_at=None):
+        """Row for one item of the city_weather_info list."""
+        return cls(
+            collection_request_id=collection_request_id,
+            city_id=item['city_id'],
+            temperature=item.get('temperature'),
+            humidity=item.get('humidity'),
+            error=item['error'][:255] if item.get('error') else None,
+            created_at=created_at or timezone.now(),
+        )
+
+    def to_item(self):
+        item = {'city_id': self.city_id, 'temperature': self.temperature, 'humidity': self.humidity}
+        if self.error is not None:
+            item['error'] = self.error
+        return item
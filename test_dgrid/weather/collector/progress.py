@@ -0,0 +1,45 @@
+import threading
+
+
+class IncompleteResults(Exception):
+    pass
+
+
+class ProgressStore:
+    """
+    Append-only results of in-progress collections, kept in this process.
+
+    Collections run as background jobs in the same process, so results are a
+    list per collection request guarded by a thread lock instead of cache
+    entries, which a cache may evict before the collection is saved.
+    Appending is O(1) and never rewrites earlier items, and progress is read
+    from the list length alone.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = {} # collection_request_id -> results appended so far
+
+    def start(self, collection_request_id):
+        with self.lock:
+            self.items[collection_request_id] = []
+
+    def append(self, collection_request_id, item):
+        with self.lock:
+            self.items.setdefault(collection_request_id, []).append(item)
+
+    def count(self, collection_request_id):
+        """Items appended so far, None if nothing is in progress."""
+        with self.lock:
+            items = self.items.get(collection_request_id)
+            return None if items is None else len(items)
+
+    def results(self, collection_request_id):
+        """Appended items in order, None if nothing is in progress."""
+        with self.lock:
+            items = self.items.get(collection_request_id)
+            return None if items is None else list(items)
+
+    def reset(self, collection_request_id):
+        with self.lock:
+            self.items.pop(collection_request_id, None)
@@ -0,0 +1,40 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class SlidingWindowLimiter:
+    """
+    Allows at most `max_calls` calls in any window of `period` seconds, which is
+    how the OpenWeather quota is defined (60 calls per minute on the free plan).
+
+    Each acquire reserves the earliest slot that keeps the window within quota
+    and sleeps until then. Reservations are taken under a thread lock instead
+    of an asyncio primitive, so one limiter can be shared by every collection
+    in the process, whatever thread or event loop it runs on.
+    """
+
+    def __init__(self, max_calls, period, clock=time.monotonic, sleep=asyncio.sleep):
+        self.max_calls = max_calls
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        # start times of the last max_calls reservations, never decreasing
+        self.slots = deque()
+
+    def reserve(self):
+        """Returns the seconds to wait before the reserved call may start."""
+        with self.lock:
+            now = self.clock()
+            slot = now
+            if len(self.slots) == self.max_calls:
+                slot = max(now, self.slots.popleft() + self.period)
+            self.slots.append(slot)
+            return slot - now
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await self.sleep(delay)
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReadingCache:
+    """
+    Latest weather reading per city, shared by every collection in the process.
+
+    A reading younger than `ttl` seconds is reused instead of calling the API
+    again; a caller can accept older ones, up to `max_staleness`, to finish
+    faster. At most `maxsize` cities are kept, least recently used first out.
+    Concurrent misses for the same city on one event loop share a single
+    in-flight fetch, which runs to completion even if the caller that started
+    it is cancelled.
+    """
+
+    def __init__(self, ttl=600, max_staleness=3600, maxsize=50000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_staleness = max_staleness
+        self.maxsize = maxsize
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict() # city_id -> (fetched_at, reading)
+        self.inflight = {} # city_id -> (loop, future)
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+
+    async def get(self, city_id, fetch, max_staleness=None):
+        """Cached reading of city_id, otherwise the result of `await fetch()`."""
+        max_age = self.ttl if max_staleness is None else min(max_staleness, self.max_staleness)
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            entry = self.entries.get(city_id)
+            if entry is not None and self.clock() - entry[0] <= max_age:
+                self.entries.move_to_end(city_id)
+                self.hits += 1
+                return entry[1]
+            inflight = self.inflight.get(city_id)
+            # futures can't be awaited from another loop, those fetch on their own
+            if inflight is not None and inflight[0] is loop:
+                self.joined += 1
+            else:
+                self.misses += 1
+                # a task of its own, so cancelling the caller that started it
+                # doesn't cancel the fetch the others are waiting on
+                inflight = self.inflight[city_id] = (loop, asyncio.ensure_future(self.fetch(city_id, fetch)))
+                inflight[1].add_done_callback(lambda task: self.finish(city_id, inflight))
+        # shielded, one waiter giving up must not cancel the others
+        return await asyncio.shield(inflight[1])
+
+    async def fetch(self, city_id, fetch):
+        reading = await fetch()
+        self.store(city_id, reading)
+        return reading
+
+    def finish(self, city_id, inflight):
+        with self.lock:
+            if self.inflight.get(city_id) is inflight:
+                del self.inflight[city_id]
+        if not inflight[1].cancelled():
+            inflight[1].exception() # retrieved, nobody may be waiting on it
+
+    def store(self, city_id, reading):
+        with self.lock:
+            self.entries[city_id] = (self.clock(), reading)
+            self.entries.move_to_end(city_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'joined': self.joined, 'size': len(self.entries)}
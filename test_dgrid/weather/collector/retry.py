@@ -0,0 +1,46 @@
+import asyncio
+import random
+
+
+async def retry(attempt, retries, base_delay, max_delay, retryable=lambda e: True, rand=random.random, sleep=asyncio.sleep):
+    """
+    Awaits attempt() and retries it up to `retries` more times while it raises
+    a retryable error, sleeping a full-jitter exponential backoff in between
+    (uniform in [0, min(max_delay, base_delay * 2**n)]) so retries of many
+    cities don't hit the upstream in lockstep.
+    """
+    n = 0
+    while True:
+        try:
+            return await attempt()
+        except Exception as e:
+            if n >= retries or not retryable(e):
+                raise
+            await sleep(rand() * min(max_delay, base_delay * 2 ** n))
+            n += 1
+
+
+async def hedge(attempt, hedge_after, hedge_attempt=None):
+    """
+    Awaits attempt(), and if it hasn't finished after `hedge_after` seconds
+    starts a second one, hedge_attempt() if given, racing it. The first
+    success wins and the other is cancelled; if both fail the first one's
+    error is raised. A hedge_after of None disables hedging.
+    """
+    if hedge_after is None:
+        return await attempt()
+    tasks = [asyncio.ensure_future(attempt())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            tasks.append(asyncio.ensure_future((hedge_attempt or attempt)()))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+        raise tasks[0].exception()
+    finally:
+        for task in tasks:
+            task.cancel()
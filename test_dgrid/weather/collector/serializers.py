@@ -3,6 +3,14 @@ from .models import *
 
 class CollectionRequestSerializer(serializers.ModelSerializer):
     created_at = serializers.ReadOnlyField()
+    # same shape as when readings were one JSON blob: a list of
+    # {city_id, temperature, humidity[, error]}, {} until collected
+    city_weather_info = serializers.SerializerMethodField()
+
     class Meta:
         model=CollectionRequest
-        fields = '__all__'
+        fields = ['id', 'created_at', 'city_weather_info']
+
+    def get_city_weather_info(self, obj):
+        # readings.all() is served from prefetch_related('readings') when the queryset has it
+        return [x.to_item() for x in obj.readings.all()] or {}
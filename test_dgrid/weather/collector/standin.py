@@ -0,0 +1,143 @@
+"""
+Local stand-in for the OpenWeather current weather API (/data/2.5/weather),
+to run and benchmark collections offline. Responses have the shape of the
+real API; latency, error rate and quota are configurable.
+
+    python -m collector.standin --port 8001 --latency 0.05 --error-rate 0.01 --max-calls 60 --period 60
+    export OPEN_WEATHER_BASE_URL=http://127.0.0.1:8001
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+from aiohttp import web
+
+
+class OpenWeatherStandIn:
+    """
+    latency (+ uniform jitter) seconds per response, error_rate the share of
+    calls answered with a 500, and at most max_calls accepted calls in any
+    window of period seconds, others get a 429 like the real API. max_calls
+    None disables the quota.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, max_calls=None, period=60.0, seed=None, clock=time.monotonic):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_calls = max_calls
+        self.period = period
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.accepted = deque()
+        self.stats = {'calls': 0, 'ok': 0, 'throttled': 0, 'errors': 0}
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route('*', '/data/2.5/weather', self.weather)
+        return app
+
+    def over_quota(self):
+        if self.max_calls is None:
+            return False
+        now = self.clock()
+        while self.accepted and self.accepted[0] <= now - self.period:
+            self.accepted.popleft()
+        if len(self.accepted) >= self.max_calls:
+            return True
+        self.accepted.append(now)
+        return False
+
+    async def weather(self, request):
+        self.stats['calls'] += 1
+        if not request.query.get('appid'):
+            return web.json_response({'cod': 401, 'message': 'Invalid API key.'}, status=401)
+        if self.over_quota():
+            self.stats['throttled'] += 1
+            return web.json_response({'cod': 429, 'message': 'Your account is temporary blocked due to exceeding of requests limitation of your subscription type.'}, status=429)
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            return web.json_response({'cod': 500, 'message': 'Internal error'}, status=500)
+        try:
+            city_id = int(request.query['id'])
+        except (KeyError, ValueError):
+            return web.json_response({'cod': '400', 'message': 'Nothing to geocode'}, status=400)
+        self.stats['ok'] += 1
+        return web.json_response(self.reading(city_id))
+
+    def reading(self, city_id):
+        # deterministic per city so repeated calls agree
+        rng = random.Random(city_id)
+        temp = round(rng.uniform(-10, 35), 2)
+        return {
+            'coord': {'lon': round(rng.uniform(-180, 180), 4), 'lat': round(rng.uniform(-90, 90), 4)},
+            'weather': [{'id': 800, 'main': 'Clear', 'description': 'clear sky', 'icon': '01d'}],
+            'base': 'stations',
+            'main': {
+                'temp': temp,
+                'feels_like': temp,
+                'temp_min': temp - 1,
+                'temp_max': temp + 1,
+                'pressure': rng.randint(990, 1030),
+                'humidity': rng.randint(20, 100),
+            },
+            'visibility': 10000,
+            'wind': {'speed': round(rng.uniform(0, 15), 2), 'deg': rng.randint(0, 359)},
+            'clouds': {'all': rng.randint(0, 100)},
+            'dt': int(time.time()),
+            'sys': {'country': 'XX', 'sunrise': 0, 'sunset': 0},
+            'timezone': 0,
+            'id': city_id,
+            'name': f'City {city_id}',
+            'cod': 200,
+        }
+
+
+async def start(standin, host='127.0.0.1', port=0):
+    """Serves standin on the running loop, returns (runner, base_url)."""
+    runner = web.AppRunner(standin.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f'http://{host}:{port}'
+
+
+def run_in_thread(standin, host='127.0.0.1', port=0):
+    """Serves standin from its own loop in a daemon thread, returns (base_url, stop)."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name='openweather-standin', daemon=True)
+    thread.start()
+    runner, base_url = asyncio.run_coroutine_threadsafe(start(standin, host, port), loop).result(10)
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(10)
+        loop.close()
+    return base_url, stop
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls answered with a 500')
+    parser.add_argument('--max-calls', type=int, help='quota, calls accepted per period (unlimited if unset)')
+    parser.add_argument('--period', type=float, default=60.0)
+    args = parser.parse_args()
+
+    standin = OpenWeatherStandIn(args.latency, args.jitter, args.error_rate, args.max_calls, args.period)
+    web.run_app(standin.app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,11 +2,25 @@ from django.test import  AsyncClient
 
 from .models import *
 from .views import load_city_ids, gather_weather_info, reset_cache
+from .ratelimit import SlidingWindowLimiter
+from .progress import ProgressStore, IncompleteResults
+from .catalog import CityCatalog, write_binary_catalog
+from .jobs import JobRunner, JobRunnerFull
+from .readings import ReadingCache
+from .retry import retry, hedge
+from .standin import OpenWeatherStandIn, run_in_thread
+from . import views
 from rest_framework import status
 
 # Create your tests here.
 import pytest
 import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
 
 
 def test_load_city_ids(): 
@@ -14,12 +28,23 @@ def test_load_city_ids():
     assert 3439525 in l
     assert 167 == len(l)
 
+@pytest.fixture
+def standin(monkeypatch):
+    """OpenWeather stand-in with a quota of 60 calls per second instead of per minute."""
+    server = OpenWeatherStandIn(max_calls=60, period=1)
+    base_url, stop = run_in_thread(server)
+    monkeypatch.setattr(views, 'OPEN_WEATHER_BASE_URL', base_url)
+    monkeypatch.setattr(views, 'weather_api_limiter', SlidingWindowLimiter(60, 1))
+    monkeypatch.setattr(views, 'reading_cache', ReadingCache())
+    yield server
+    stop()
+
 @pytest.mark.asyncio
-async def test_collection_request_creation_progress(client):
+async def test_collection_request_creation_progress(client, standin):
     collection_request_id = 1
     task = asyncio.create_task(gather_weather_info(collection_request_id))
 
-    await asyncio.sleep(60)
+    await asyncio.sleep(0.5)
     response = client.get('/collection-request/1/progress')
     assert response.status_code == status.HTTP_200_OK
     assert response.json()['result'] > 0.3 and  response.json()['result'] < 0.4
@@ -32,16 +57,19 @@ async def test_collection_request_creation_progress(client):
     assert response.json()['result'] == 1
 
 @pytest.mark.django_db(transaction=True)
-def test_collection_request(client):
+def test_collection_request(client, standin):
     response = client.post('/collection-request/', data={'id':1})
-    assert response.status_code == status.HTTP_201_CREATED
+    assert response.status_code == status.HTTP_202_ACCEPTED
 
+    views.job_runner.wait(1)
     cr =  CollectionRequest.objects.first()
     assert hasattr(cr,'created_at')
 
-    current_ids = list(map(lambda x : x['city_id'] , cr.city_weather_info))
+    city_weather_info = [x.to_item() for x in cr.readings.all()]
+    current_ids = list(map(lambda x : x['city_id'] , city_weather_info))
     expected_ids = load_city_ids() 
     assert sorted(current_ids) == sorted(expected_ids)
+    assert not any('error' in x for x in city_weather_info)
 
 @pytest.mark.django_db(transaction=True)
 def test_get_collection_request(client):
@@ -50,3 +78,478 @@ def test_get_collection_request(client):
 
     response = client.get('/collection-request/1')
     assert response.status_code == status.HTTP_200_OK
+
+
+def test_sliding_window_limiter():
+    now = [0]
+    limiter = SlidingWindowLimiter(max_calls=2, period=10, clock=lambda: now[0])
+
+    assert [0, 0, 10, 10, 20] == [limiter.reserve() for _ in range(5)]
+    now[0] = 25
+    assert 0 == limiter.reserve()
+
+@pytest.mark.asyncio
+async def test_gather_weather_info_shares_one_session(monkeypatch):
+    sessions, fetched = set(), []
+    in_flight = [0, 0] # current, max
+
+    async def fake_create_weather_info_item(city_id, collection_request_id, session, limiter=None, max_staleness=None):
+        sessions.add(session)
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight)
+        await asyncio.sleep(0)
+        fetched.append(city_id)
+        in_flight[0] -= 1
+
+    monkeypatch.setattr(views, 'create_weather_info_item', fake_create_weather_info_item)
+    await gather_weather_info(1, limiter=SlidingWindowLimiter(1000, 60), concurrency=5)
+
+    assert sorted(fetched) == sorted(load_city_ids())
+    assert 1 == len(sessions)
+    assert 5 == in_flight[1]
+
+
+def test_progress_store():
+    progress = ProgressStore()
+    assert progress.count(7) is None
+
+    progress.start(7)
+    for i in range(3):
+        progress.append(7, {'city_id': i})
+
+    assert 3 == progress.count(7)
+    assert [{'city_id': 0}, {'city_id': 1}, {'city_id': 2}] == progress.results(7)
+    progress.reset(7)
+    assert progress.results(7) is None
+
+@pytest.mark.asyncio
+async def test_progress_store_concurrent_appends():
+    progress = ProgressStore()
+
+    async def append(i):
+        await asyncio.sleep(0)
+        progress.append(8, i)
+
+    await asyncio.gather(*(append(i) for i in range(500)))
+
+    assert list(range(500)) == sorted(progress.results(8))
+    progress.reset(8)
+
+def test_progress_store_overlapping_collections_past_the_cache_size():
+    from django.conf import settings
+    progress = ProgressStore()
+    size = settings.CACHES['default']['OPTIONS']['MAX_ENTRIES'] + 500
+    progress.start(11)
+    progress.start(12)
+
+    for i in range(size):
+        progress.append(11, {'city_id': i})
+        progress.append(12, {'city_id': i})
+
+    assert (size, size) == (progress.count(11), progress.count(12))
+    assert [{'city_id': i} for i in range(size)] == progress.results(11) == progress.results(12)
+    progress.reset(11)
+    progress.reset(12)
+
+@pytest.mark.django_db
+def test_save_collection_results_refuses_missing_readings(monkeypatch):
+    views.progress.start(13)
+    for i in range(3):
+        views.progress.append(13, {'city_id': i, 'temperature': 20.0, 'humidity': 50})
+    results = views.progress.results
+    monkeypatch.setattr(views.progress, 'results', lambda collection_request_id: results(collection_request_id)[1:])
+
+    with pytest.raises(IncompleteResults, match='1 of 3'):
+        views.save_collection_results(13)
+    assert 0 == CityWeatherReading.objects.filter(collection_request_id=13).count()
+    assert views.progress.count(13) is None
+
+def test_collection_request_creation_progress_reads_counter(client):
+    progress = views.progress
+    progress.start(9)
+    for i in range(10):
+        progress.append(9, {'city_id': i})
+
+    response = client.get('/collection-request/9/progress')
+
+    assert response.json()['result'] == 10 / len(load_city_ids())
+    progress.reset(9)
+
+
+def test_city_catalog_reloads_on_mtime_change(tmp_path):
+    path = tmp_path / 'city_ids.json'
+    path.write_text(json.dumps({'ids': [1, 2, 3]}))
+    catalog = CityCatalog(path)
+
+    assert [1, 2, 3] == list(catalog.ids())
+    assert 3 == catalog.count()
+    assert 1 == catalog.loads
+
+    path.write_text(json.dumps({'ids': [4, 5]}))
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+
+    assert [4, 5] == list(catalog.ids())
+    assert 2 == catalog.loads
+
+def test_binary_city_catalog(tmp_path):
+    path = tmp_path / 'city_ids.bin'
+    write_binary_catalog(load_city_ids(), path)
+
+    catalog = CityCatalog(path)
+
+    assert list(load_city_ids()) == list(catalog.ids())
+    assert 8 + 8 * 167 == os.path.getsize(path)
+
+
+def test_job_runner_limits_running_jobs():
+    runner = JobRunner(max_running=2, max_queued=10)
+    running = [0, 0] # current, max
+
+    async def job():
+        running[0] += 1
+        running[1] = max(running)
+        await asyncio.sleep(0.02)
+        running[0] -= 1
+
+    for i in range(6):
+        runner.submit(i, job)
+    for i in range(6):
+        assert 'done' == runner.wait(i, timeout=5).status
+
+    assert 2 == running[1]
+
+def test_job_runner_full_and_failed_jobs():
+    runner = JobRunner(max_running=1, max_queued=1)
+    release = threading.Event()
+
+    async def blocked():
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    async def failing():
+        raise RuntimeError('upstream down')
+
+    runner.submit(1, blocked)
+    runner.submit(2, failing)
+    with pytest.raises(JobRunnerFull):
+        runner.submit(3, blocked)
+    release.set()
+
+    assert 'failed' == runner.wait(2, timeout=5).status
+    assert 'RuntimeError: upstream down' == runner.get(2).error
+
+@pytest.mark.django_db(transaction=True)
+def test_collection_request_runs_in_background(client, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    async def fake_gather_weather_info(collection_request_id, max_staleness=None):
+        views.progress.start(collection_request_id)
+        views.progress.append(collection_request_id, {'city_id': 1, 'temperature': 20.0, 'humidity': 50})
+        started.set()
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(views, 'gather_weather_info', fake_gather_weather_info)
+
+    response = client.post('/collection-request/', data={'id': 5})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert '/collection-request/5/progress' == response['Location']
+
+    started.wait(5)
+    response = client.get('/collection-request/5/progress')
+    assert 'running' == response.json()['job']['status']
+    assert response.json()['result'] == 1 / len(load_city_ids())
+
+    release.set()
+    views.job_runner.wait(5, timeout=5)
+    response = client.get('/collection-request/5/progress')
+    assert 'done' == response.json()['job']['status']
+    assert 1 == response.json()['result']
+    assert [{'city_id': 1, 'temperature': 20.0, 'humidity': 50}] == client.get('/collection-request/5').json()['city_weather_info']
+
+
+@pytest.mark.asyncio
+async def test_reading_cache_ttl_and_max_staleness():
+    now = [0]
+    cache = ReadingCache(ttl=10, max_staleness=100, maxsize=10, clock=lambda: now[0])
+    calls = []
+
+    async def fetch():
+        calls.append(now[0])
+        return {'city_id': 1, 'fetched': now[0]}
+
+    assert 0 == (await cache.get(1, fetch))['fetched']
+    now[0] = 10
+    assert 0 == (await cache.get(1, fetch))['fetched']
+    now[0] = 50
+    assert 0 == (await cache.get(1, fetch, max_staleness=60))['fetched']
+    assert 50 == (await cache.get(1, fetch))['fetched']
+    now[0] = 51
+    assert 51 == (await cache.get(1, fetch, max_staleness=0))['fetched']
+    assert [0, 50, 51] == calls
+
+@pytest.mark.asyncio
+async def test_reading_cache_is_bounded():
+    cache = ReadingCache(maxsize=2)
+
+    for city_id in [1, 2, 1, 3]:
+        async def fetch(city_id=city_id):
+            return {'city_id': city_id}
+        await cache.get(city_id, fetch)
+
+    assert [1, 3] == list(cache.entries)
+
+@pytest.mark.asyncio
+async def test_reading_cache_single_flight():
+    cache = ReadingCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'city_id': 1}
+
+    results = await asyncio.gather(*(cache.get(1, fetch) for _ in range(10)))
+
+    assert [{'city_id': 1}] * 10 == results
+    assert 1 == len(calls)
+    assert {'hits': 0, 'misses': 1, 'joined': 9, 'size': 1} == cache.stats()
+
+@pytest.mark.asyncio
+async def test_reading_cache_failures_are_shared_not_cached():
+    cache = ReadingCache()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError('upstream down')
+
+    results = await asyncio.gather(*(cache.get(1, failing) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(x, RuntimeError) for x in results)
+    assert 0 == len(cache.entries) and {} == cache.inflight
+
+@pytest.mark.asyncio
+async def test_reading_cache_owner_cancelled():
+    cache = ReadingCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'city_id': 1}
+
+    owner = asyncio.ensure_future(cache.get(1, fetch))
+    await asyncio.sleep(0)
+    joiner = asyncio.ensure_future(cache.get(1, fetch))
+    await asyncio.sleep(0)
+    owner.cancel()
+
+    assert {'city_id': 1} == await joiner
+    assert owner.cancelled()
+    assert 1 == len(calls)
+    assert {'hits': 0, 'misses': 1, 'joined': 1, 'size': 1} == cache.stats()
+
+@pytest.mark.django_db(transaction=True)
+def test_collection_request_max_staleness(client, monkeypatch):
+    received = []
+
+    async def fake_gather_weather_info(collection_request_id, max_staleness=None):
+        received.append(max_staleness)
+
+    monkeypatch.setattr(views, 'gather_weather_info', fake_gather_weather_info)
+
+    response = client.post('/collection-request/', data={'id': 6, 'max_staleness': 'soon'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = client.post('/collection-request/', data={'id': 6, 'max_staleness': 1800})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+
+    views.job_runner.wait(6, timeout=5)
+    assert [1800.0] == received
+
+
+@pytest.mark.asyncio
+async def test_retry_with_backoff():
+    delays, attempts = [], []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise views.UpstreamError(503)
+        return 'ok'
+
+    assert 'ok' == await retry(flaky, 3, 0.5, 0.8, views.is_retryable, rand=lambda: 1.0, sleep=sleep)
+    assert [0.5, 0.8] == delays
+
+    async def not_found():
+        attempts.append(1)
+        raise views.UpstreamError(404)
+
+    attempts.clear()
+    with pytest.raises(views.UpstreamError):
+        await retry(not_found, 3, 0.5, 8, views.is_retryable, sleep=sleep)
+    assert 1 == len(attempts)
+
+@pytest.mark.asyncio
+async def test_hedge_races_slow_attempts():
+    started, cancelled = [], []
+
+    async def attempt():
+        n = len(started)
+        started.append(n)
+        try:
+            await asyncio.sleep(1 if n == 0 else 0)
+        except asyncio.CancelledError:
+            cancelled.append(n)
+            raise
+        return n
+
+    assert 1 == await hedge(attempt, 0.01)
+    await asyncio.sleep(0)
+    assert [0] == cancelled
+
+class FakeResponse:
+    def __init__(self, status, delay):
+        self.status = status
+        self.delay = delay
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.delay)
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+    async def json(self):
+        return {'main': {'temp': 20.0, 'humidity': 50}}
+
+class FakeSession:
+    """Answers each request with the next (status, delay) of `responses`."""
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def request(self, method, url):
+        return FakeResponse(*self.responses.pop(0))
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+
+@pytest.mark.asyncio
+async def test_fetch_retries_timeouts_against_the_limiter(monkeypatch):
+    monkeypatch.setattr(views, 'OPEN_WEATHER_TIMEOUT', 0.01)
+    monkeypatch.setattr(views, 'OPEN_WEATHER_RETRY_BASE_DELAY', 0)
+    limiter = CountingLimiter()
+
+    reading = await views.fetch_weather_reading(1, FakeSession([(200, 1), (500, 0), (200, 0)]), limiter)
+
+    assert {'city_id': 1, 'temperature': 20.0, 'humidity': 50} == reading
+    assert 3 == limiter.acquired
+
+@pytest.mark.asyncio
+async def test_hedge_does_not_count_time_queued_on_the_limiter(monkeypatch):
+    monkeypatch.setattr(views, 'OPEN_WEATHER_HEDGE_AFTER', 0.01)
+    limiter = SlidingWindowLimiter(max_calls=1, period=0.05)
+    limiter.reserve() # saturated, the next call waits a whole period
+    reserve, reserved = limiter.reserve, []
+    monkeypatch.setattr(limiter, 'reserve', lambda: reserved.append(1) or reserve())
+    session = FakeSession([(200, 0)])
+
+    assert 20.0 == (await views.fetch_weather_reading(1, session, limiter))['temperature']
+    assert [] == session.responses
+    assert 1 == len(reserved)
+
+    # a slow call is still hedged, and only then takes a second slot
+    limiter = CountingLimiter()
+    session = FakeSession([(200, 1), (200, 0)])
+    assert 20.0 == (await views.fetch_weather_reading(1, session, limiter))['temperature']
+    assert 2 == limiter.acquired
+
+@pytest.mark.asyncio
+async def test_failed_cities_are_recorded_with_their_error(monkeypatch):
+    monkeypatch.setattr(views, 'reading_cache', ReadingCache())
+
+    async def fetch_weather_reading(city_id, session, limiter):
+        if city_id == 3439525:
+            raise views.UpstreamError(404)
+        return {'city_id': city_id, 'temperature': 20.0, 'humidity': 50}
+
+    monkeypatch.setattr(views, 'fetch_weather_reading', fetch_weather_reading)
+    await gather_weather_info(10, limiter=CountingLimiter())
+
+    results = views.get_cache_current_results(10)
+    views.reset_cache(10)
+    assert len(load_city_ids()) == len(results)
+    assert [{'city_id': 3439525, 'temperature': None, 'humidity': None, 'error': 'UpstreamError: upstream returned HTTP 404'}] == [x for x in results if 'error' in x]
+
+
+def test_standin_quota_and_errors():
+    import urllib.request, urllib.error
+    server = OpenWeatherStandIn(max_calls=2, period=60)
+    base_url, stop = run_in_thread(server)
+    url = f'{base_url}/data/2.5/weather?id=3439525&appid=x&units=metric'
+    try:
+        with urllib.request.urlopen(url) as resp:
+            body = json.load(resp)
+        urllib.request.urlopen(url).close()
+        with pytest.raises(urllib.error.HTTPError) as throttled:
+            urllib.request.urlopen(url)
+        server.max_calls, server.error_rate = None, 1.0
+        with pytest.raises(urllib.error.HTTPError) as failed:
+            urllib.request.urlopen(url)
+    finally:
+        stop()
+
+    assert 3439525 == body['id'] and {'temp', 'humidity'} <= set(body['main'])
+    assert 429 == throttled.value.code
+    assert 500 == failed.value.code
+    assert {'calls': 4, 'ok': 2, 'throttled': 1, 'errors': 1} == server.stats
+
+
+@pytest.mark.django_db
+def test_readings_keep_the_response_shape(client, django_assert_num_queries):
+    items = [
+        {'city_id': 3, 'temperature': 20.5, 'humidity': 40},
+        {'city_id': 1, 'temperature': None, 'humidity': None, 'error': 'TimeoutError'},
+    ]
+    for id in [1, 2]:
+        CollectionRequest(id=id).save()
+        CityWeatherReading.objects.bulk_create([CityWeatherReading.from_item(id, x) for x in items])
+    CollectionRequest(id=3).save()
+
+    assert items == client.get('/collection-request/1').json()['city_weather_info']
+    assert {} == client.get('/collection-request/3').json()['city_weather_info']
+    # one query for the requests and one for all their readings
+    with django_assert_num_queries(2):
+        response = client.get('/collection-request/')
+    assert [items, items, {}] == [x['city_weather_info'] for x in response.json()]
+
+def test_backfill_migration(tmp_path):
+    database = tmp_path / 'migrate.db'
+    env = {**os.environ, 'DATABASE_ENGINE': 'django.db.backends.sqlite3', 'DATABASE_NAME': str(database)}
+    migrate = lambda target: subprocess.run(
+        [sys.executable, 'manage.py', 'migrate', 'collector', target],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env, capture_output=True, text=True, check=True,
+    )
+    blob = [{'city_id': 7, 'temperature': 1.5, 'humidity': 80}, {'city_id': 8, 'temperature': None, 'humidity': None, 'error': 'TimeoutError'}]
+
+    migrate('0002')
+    with sqlite3.connect(database) as db:
+        db.execute("INSERT INTO collector_collectionrequest VALUES (1, '2021-06-27 01:55:00', ?)", [json.dumps(blob)])
+        db.execute("INSERT INTO collector_collectionrequest VALUES (2, '2021-06-27 01:56:00', '{}')")
+    migrate('0004')
+    with sqlite3.connect(database) as db:
+        rows = db.execute('SELECT collection_request_id, city_id, temperature, humidity, error, created_at FROM collector_cityweatherreading ORDER BY id').fetchall()
+    assert [(1, 7, 1.5, 80, None, '2021-06-27 01:55:00'), (1, 8, None, None, 'TimeoutError', '2021-06-27 01:55:00')] == rows
+
+    migrate('0002')
+    with sqlite3.connect(database) as db:
+        restored = db.execute('SELECT city_weather_info FROM collector_collectionrequest WHERE id = 1').fetchone()[0]
+    assert blob == json.loads(restored)
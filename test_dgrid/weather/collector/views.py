@@ -8,9 +8,19 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
 from .serializers import CollectionRequestSerializer
-from weather.settings import OPEN_WEATHER_API_KEY
+from .ratelimit import SlidingWindowLimiter
+from .progress import ProgressStore, IncompleteResults
+from .catalog import CityCatalog
+from .jobs import JobRunner, JobRunnerFull, JobExists
+from .readings import ReadingCache
+from .retry import retry, hedge
+from weather.settings import OPEN_WEATHER_API_KEY, OPEN_WEATHER_BASE_URL, OPEN_WEATHER_MAX_CALLS, OPEN_WEATHER_PERIOD, OPEN_WEATHER_MAX_CONCURRENCY
+from weather.settings import COLLECTION_MAX_RUNNING_JOBS, COLLECTION_MAX_QUEUED_JOBS, CITY_READINGS_BATCH_SIZE
+from weather.settings import WEATHER_CACHE_TTL, WEATHER_CACHE_MAX_STALENESS, WEATHER_CACHE_MAX_ENTRIES
+from weather.settings import OPEN_WEATHER_TIMEOUT, OPEN_WEATHER_RETRIES, OPEN_WEATHER_RETRY_BASE_DELAY, OPEN_WEATHER_RETRY_MAX_DELAY, OPEN_WEATHER_HEDGE_AFTER
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
 
-import json
 import asyncio
 from  weather.settings import CITY_IDS_FP
 
@@ -18,95 +28,186 @@ from  weather.settings import CITY_IDS_FP
 @api_view(['GET'])
 def collection_request_creation_progress(request, pk):  
     collection_request_id = pk
-    current_data = get_cache_current_results(collection_request_id)
-    if current_data is None:        
-        return Response({'result': 1}, status=status.HTTP_200_OK)        
-    total = load_city_ids()
-    result = len(current_data)/len(total)
-    return Response({'result': result}, status=status.HTTP_200_OK)
-
+    job = job_runner.get(collection_request_id)
+    collected = progress.count(collection_request_id)
+    if job is not None and not job.finished:
+        result = (collected or 0)/city_catalog.count()
+    elif collected is not None:
+        result = collected/city_catalog.count()
+    else:
+        result = 1
+    data = {'result': result}
+    if job is not None:
+        data['job'] = job.to_dict()
+    return Response(data, status=status.HTTP_200_OK)
+
+
+city_catalog = CityCatalog(CITY_IDS_FP)
 
 def load_city_ids():
-    with open(CITY_IDS_FP) as f:
-        result = json.load(f)['ids']
-    return result
+    return city_catalog.ids()
+
+progress = ProgressStore()
 
 def cache_current_results(collection_request_id, new_data):
-    from django.core.cache import cache
-    current_data = cache.get(collection_request_id, [])
-    cache.set(collection_request_id, current_data + [new_data], timeout=300)
+    progress.append(collection_request_id, new_data)
     return None
 
 def get_cache_current_results(collection_request_id):
-    from django.core.cache import cache
-    current_data = cache.get(collection_request_id)
-    return current_data
+    return progress.results(collection_request_id)
 
 def reset_cache(collection_request_id):
-    from django.core.cache import cache
-    cache.delete(collection_request_id)
+    progress.reset(collection_request_id)
     return None
 
-async def create_weather_info_item(city_id, collection_request_id, session):
-    url = f'http://api.openweathermap.org/data/2.5/weather?id={city_id}&appid={OPEN_WEATHER_API_KEY}&units=metric'
-    resp = await session.request(method="POST", url=url)
-    result = await resp.json()
-    cache_current_results(
-        collection_request_id,
-        {
-            'city_id' :city_id,
-            'temperature' : result['main']['temp'],
-            'humidity' : result['main']['humidity']
-        }
+# one quota per API key, so one limiter for the whole process
+weather_api_limiter = SlidingWindowLimiter(OPEN_WEATHER_MAX_CALLS, OPEN_WEATHER_PERIOD)
+reading_cache = ReadingCache(WEATHER_CACHE_TTL, WEATHER_CACHE_MAX_STALENESS, WEATHER_CACHE_MAX_ENTRIES)
+
+class UpstreamError(Exception):
+    def __init__(self, status):
+        super().__init__(f'upstream returned HTTP {status}')
+        self.status = status
+
+def is_retryable(e):
+    # throttling, server errors, timeouts and connection errors may pass on a new attempt,
+    # a 4xx (unknown city, bad key) or a malformed body won't
+    if isinstance(e, UpstreamError):
+        return e.status == 429 or e.status >= 500
+    from aiohttp import ClientError
+    return isinstance(e, (asyncio.TimeoutError, ClientError))
+
+def error_message(e):
+    return f'{type(e).__name__}: {e}' if str(e) else type(e).__name__
+
+async def call_weather_api(city_id, session, timeout=None):
+    """One API call, the caller has taken its slot from the limiter."""
+    url = f'{OPEN_WEATHER_BASE_URL}/data/2.5/weather?id={city_id}&appid={OPEN_WEATHER_API_KEY}&units=metric'
+
+    async def call():
+        async with session.request(method="POST", url=url) as resp:
+            if resp.status >= 400:
+                raise UpstreamError(resp.status)
+            return await resp.json()
+    return await asyncio.wait_for(call(), timeout)
+
+async def request_weather(city_id, session, limiter, timeout=None):
+    """One API call. Every attempt, retry or hedge, takes its own slot from the limiter."""
+    await limiter.acquire()
+    # the timeout starts once the limiter lets the call go
+    return await call_weather_api(city_id, session, timeout)
+
+async def fetch_weather_reading(city_id, session, limiter):
+    async def attempt():
+        # only the API call is hedged: time queued on the limiter doesn't count
+        # towards hedge_after, and a hedge takes its own slot only once it fires
+        await limiter.acquire()
+        return await hedge(
+            lambda: call_weather_api(city_id, session, OPEN_WEATHER_TIMEOUT), OPEN_WEATHER_HEDGE_AFTER,
+            hedge_attempt=lambda: request_weather(city_id, session, limiter, OPEN_WEATHER_TIMEOUT),
+        )
+    result = await retry(
+        attempt, OPEN_WEATHER_RETRIES, OPEN_WEATHER_RETRY_BASE_DELAY, OPEN_WEATHER_RETRY_MAX_DELAY,
+        retryable=is_retryable,
     )
+    return {
+        'city_id' :city_id,
+        'temperature' : result['main']['temp'],
+        'humidity' : result['main']['humidity']
+    }
+
+async def create_weather_info_item(city_id, collection_request_id, session, limiter=None, max_staleness=None):
+    limiter = limiter or weather_api_limiter
+    try:
+        reading = await reading_cache.get(city_id, lambda: fetch_weather_reading(city_id, session, limiter), max_staleness)
+    except Exception as e:
+        # one failing city is recorded as such instead of aborting the collection
+        reading = {'city_id': city_id, 'temperature': None, 'humidity': None, 'error': error_message(e)}
+    cache_current_results(collection_request_id, reading)
     return None
 
-async def schedule_n_seconds(n):
-    await asyncio.sleep(n)
-
-async def gather_weather_info(collection_request_id):
-    city_ids = load_city_ids() 
-    from aiohttp import ClientSession
-    for i in range(0, len(city_ids), 60):
-        slice = city_ids[i:i+60]         
-        tasks = []
-        session = ClientSession()
-        for city_id in slice: 
-            tasks.append(
-                create_weather_info_item(city_id, collection_request_id, session)
-            )
-
-        last_iteration = (i == list(range(0, len(city_ids), 60))[-1])
-        if not last_iteration:
-            tasks.append(schedule_n_seconds(60))
-
-        await asyncio.gather(*tasks)
-        await session.close()
+async def gather_weather_info(collection_request_id, limiter=None, concurrency=None, max_staleness=None):
+    """
+    Fetches every city through one pooled session. A fixed number of workers
+    pull city ids, cities with a recent enough cached reading are served from
+    reading_cache and the others wait for the rate limiter, so the collection
+    takes as long as the quota requires and no longer.
+    """
+    limiter = limiter or weather_api_limiter
+    concurrency = concurrency or OPEN_WEATHER_MAX_CONCURRENCY
+    pending = iter(load_city_ids())
+    progress.start(collection_request_id)
+    from aiohttp import ClientSession, TCPConnector
+
+    async def worker(session):
+        for city_id in pending:
+            await create_weather_info_item(city_id, collection_request_id, session, limiter, max_staleness)
+
+    async with ClientSession(connector=TCPConnector(limit=concurrency)) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+
+
+job_runner = JobRunner(COLLECTION_MAX_RUNNING_JOBS, COLLECTION_MAX_QUEUED_JOBS)
+
+def save_collection_results(collection_request_id):
+    try:
+        data = get_cache_current_results(collection_request_id) or []
+        collected = progress.count(collection_request_id) or 0
+        if len(data) != collected:
+            # never save a shortened set of readings as if it were the whole collection
+            raise IncompleteResults(f'{collected - len(data)} of {collected} collected readings are missing, nothing was saved')
+        readings = [CityWeatherReading.from_item(collection_request_id, x) for x in data]
+        with transaction.atomic():
+            CityWeatherReading.objects.bulk_create(readings, batch_size=CITY_READINGS_BATCH_SIZE)
+    finally:
+        reset_cache(collection_request_id)
+        # runs outside the request cycle, nothing else closes this thread's connection
+        connection.close()
+
+async def run_collection(collection_request_id, max_staleness=None):
+    """Background job of a collection request, whatever was collected is saved even if it fails."""
+    try:
+        await gather_weather_info(collection_request_id, max_staleness=max_staleness)
+    finally:
+        await sync_to_async(save_collection_results)(collection_request_id)
 
 
 @api_view(['GET'])
 def get_collection_request(request, pk):
-    cr = get_object_or_404(CollectionRequest.objects, id=pk)
+    cr = get_object_or_404(CollectionRequest.objects.prefetch_related('readings'), id=pk)
     serializer = CollectionRequestSerializer(cr)
     return Response(serializer.data)
 
 @api_view(['GET','POST','DELETE'])
 def collection_request(request):
     if request.method == 'GET':
-        items = CollectionRequest.objects.all()
+        items = CollectionRequest.objects.prefetch_related('readings')
         serializer = CollectionRequestSerializer(items, many=True)
         return Response(serializer.data)
     elif request.method == 'POST':
         serializer = CollectionRequestSerializer(data=request.data)
+        max_staleness = request.data.get('max_staleness')
+        if max_staleness is not None:
+            # seconds, how old a cached city reading may be, capped at WEATHER_CACHE_MAX_STALENESS
+            try:
+                max_staleness = float(max_staleness)
+            except (TypeError, ValueError):
+                max_staleness = -1
+            if not 0 <= max_staleness < float('inf'):
+                return Response({'max_staleness': ['A non-negative number of seconds is required.']}, status=status.HTTP_400_BAD_REQUEST)
         if serializer.is_valid():
             serializer.save()
             collection_request_id = serializer.data['id']
-            asyncio.run(gather_weather_info(collection_request_id))
-
-            data = get_cache_current_results(collection_request_id)
-            cr = get_object_or_404(CollectionRequest.objects, id = collection_request_id)
-            cr.city_weather_info=data
-            cr.save()
-            reset_cache(collection_request_id)
-            return Response({'value':'OK'}, status=status.HTTP_201_CREATED)
+            try:
+                job = job_runner.submit(collection_request_id, run_collection, collection_request_id, max_staleness)
+            except (JobRunnerFull, JobExists) as e:
+                CollectionRequest.objects.filter(id=collection_request_id).delete()
+                code = status.HTTP_503_SERVICE_UNAVAILABLE if isinstance(e, JobRunnerFull) else status.HTTP_409_CONFLICT
+                return Response({'detail': str(e)}, status=code)
+            progress_url = f'/collection-request/{collection_request_id}/progress'
+            return Response(
+                {'value': 'ACCEPTED', 'job': job.to_dict(), 'progress': progress_url},
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': progress_url},
+            )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
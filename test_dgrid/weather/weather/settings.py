@@ -117,6 +117,13 @@ CACHES = {
     }
 }
 
+# collections run as background jobs in the web process: how many run at once, how many may wait
+COLLECTION_MAX_RUNNING_JOBS = int(os.environ.get('COLLECTION_MAX_RUNNING_JOBS', 2))
+COLLECTION_MAX_QUEUED_JOBS = int(os.environ.get('COLLECTION_MAX_QUEUED_JOBS', 20))
+
+# CityWeatherReading rows per INSERT when a collection is saved
+CITY_READINGS_BATCH_SIZE = 1000
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -157,5 +164,29 @@ STATIC_URL = '/static/'
 
 check_env_variables(['OPEN_WEATHER_API_KEY'])
 OPEN_WEATHER_API_KEY = os.environ.get('OPEN_WEATHER_API_KEY')
-
-CITY_IDS_FP = BASE_DIR / 'custom_data' / 'city_ids.json'
\ No newline at end of file
+# point it at a local stand-in (python -m collector.standin) to collect offline
+OPEN_WEATHER_BASE_URL = os.environ.get('OPEN_WEATHER_BASE_URL', 'http://api.openweathermap.org').rstrip('/')
+
+# API quota shared by every collection in the process: max calls per period (seconds)
+OPEN_WEATHER_MAX_CALLS = int(os.environ.get('OPEN_WEATHER_MAX_CALLS', 60))
+OPEN_WEATHER_PERIOD = float(os.environ.get('OPEN_WEATHER_PERIOD', 60))
+# requests in flight at once per collection, also the size of the connection pool
+OPEN_WEATHER_MAX_CONCURRENCY = int(os.environ.get('OPEN_WEATHER_MAX_CONCURRENCY', 10))
+
+# per city: seconds per attempt, extra attempts on timeouts/429/5xx with jittered exponential
+# backoff (base and max delay in seconds), and seconds before a slow attempt gets a hedged
+# duplicate (unset disables hedging). Retries and hedges count against the quota.
+OPEN_WEATHER_TIMEOUT = float(os.environ.get('OPEN_WEATHER_TIMEOUT', 10))
+OPEN_WEATHER_RETRIES = int(os.environ.get('OPEN_WEATHER_RETRIES', 3))
+OPEN_WEATHER_RETRY_BASE_DELAY = float(os.environ.get('OPEN_WEATHER_RETRY_BASE_DELAY', 0.5))
+OPEN_WEATHER_RETRY_MAX_DELAY = float(os.environ.get('OPEN_WEATHER_RETRY_MAX_DELAY', 8))
+OPEN_WEATHER_HEDGE_AFTER = float(os.environ['OPEN_WEATHER_HEDGE_AFTER']) if os.environ.get('OPEN_WEATHER_HEDGE_AFTER') else None
+
+# city readings shared across collections: reused while younger than the TTL (seconds),
+# POST max_staleness accepts older ones up to WEATHER_CACHE_MAX_STALENESS
+WEATHER_CACHE_TTL = float(os.environ.get('WEATHER_CACHE_TTL', 600))
+WEATHER_CACHE_MAX_STALENESS = float(os.environ.get('WEATHER_CACHE_MAX_STALENESS', 3600))
+WEATHER_CACHE_MAX_ENTRIES = int(os.environ.get('WEATHER_CACHE_MAX_ENTRIES', 50000))
+
+# JSON ({"ids": [...]}) or binary .bin catalog (python manage.py build_city_catalog)
+CITY_IDS_FP = Path(os.environ.get('CITY_IDS_FP', BASE_DIR / 'custom_data' / 'city_ids.json'))
\ No newline at end of file
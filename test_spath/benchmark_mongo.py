@@ -0,0 +1,50 @@
+"""
+get_by_id latency on MongoDBTasksRepository as the collection grows, with
+and without the unique index on id. Needs the Mongo container running:
+
+    docker compose --env-file dev.env up -d
+    python benchmark_mongo.py
+"""
+import random
+import timeit
+
+import config
+from repository import MongoDBTasksRepository, ensure_task_indexes, mongo_clients
+
+
+def fill(collection, n, chunk=10_000):
+    collection.delete_many({})
+    for start in range(1, n + 1, chunk):
+        collection.insert_many(
+            {"id": i, "name": f"Task {i}", "status": bool(i % 2)} for i in range(start, min(start + chunk, n + 1))
+        )
+
+
+def bench_get_by_id(repository, n, lookups=200):
+    ids = [random.randint(1, n) for _ in range(lookups)]
+    elapsed = timeit.timeit(lambda: [repository.get_by_id(x) for x in ids], number=1)
+    return elapsed / lookups * 1e3  # ms per lookup
+
+
+def main():
+    # the registry always hands out a client, only a ping tells if Mongo is up
+    if not mongo_clients.warm_up():
+        raise SystemExit("MongoDB is unreachable, start it with docker compose first.")
+    repository = MongoDBTasksRepository()
+    collection = repository.client[config.DATABASE_NAME]["benchmark_tasks"]
+    repository.collection = collection
+
+    print(f"{'n':>10} {'no index (ms)':>15} {'indexed (ms)':>14}")
+    for n in [1_000, 10_000, 100_000, 1_000_000]:
+        fill(collection, n)
+        collection.drop_indexes()
+        no_index = bench_get_by_id(repository, n)
+        ensure_task_indexes(collection)
+        indexed = bench_get_by_id(repository, n)
+        print(f"{n:>10} {no_index:>15.3f} {indexed:>14.3f}")
+
+    collection.drop()
+
+
+if __name__ == "__main__":
+    main()
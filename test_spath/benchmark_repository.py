@@ -0,0 +1,75 @@
+"""
+Compare get_by_id on the indexed InMemoryTasksRepository against the
+previous list based implementation, and memory/throughput of
+ColumnarTasksRepository against InMemoryTasksRepository.
+
+    python benchmark_repository.py
+"""
+import random
+import time
+import timeit
+import tracemalloc
+
+from repository import ColumnarTasksRepository, InMemoryTasksRepository, Task
+
+
+class ListTasksRepository:
+    """Previous implementation: tasks kept in a list, lookups scan it."""
+
+    def __init__(self):
+        self.tasks = []
+
+    def add(self, task: Task):
+        self.tasks.append(task)
+
+    def get_by_id(self, id):
+        for x in self.tasks:
+            if x.id == id:
+                return x
+        return None
+
+
+def fill(repository, n, start=4):
+    # InMemoryTasksRepository is seeded with ids 1-3
+    for i in range(start, n + 1):
+        repository.add(Task(id=i, name=f"Task {i}", status=bool(i % 2)))
+    return repository
+
+
+def bench_get_by_id(repository, n, lookups=1000):
+    ids = [random.randint(1, n) for _ in range(lookups)]
+    elapsed = timeit.timeit(lambda: [repository.get_by_id(x) for x in ids], number=1)
+    return elapsed / lookups * 1e6  # us per lookup
+
+
+def bench_memory(repository_class, n):
+    """Returns (MB held by the filled repository, adds per second)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    repository = fill(repository_class(), n)
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return repository, size / 2**20, n / elapsed
+
+
+def main():
+    print(f"{'n':>10} {'list (us)':>12} {'indexed (us)':>14}")
+    for n in [100, 1_000, 10_000, 100_000]:
+        list_repo = fill(ListTasksRepository(), n, start=1)
+        indexed_repo = fill(InMemoryTasksRepository(), n)
+        print(f"{n:>10} {bench_get_by_id(list_repo, n):>12.2f} {bench_get_by_id(indexed_repo, n):>14.2f}")
+
+    print()
+    print(f"{'n':>10} {'backend':>10} {'MB':>10} {'adds/s':>12} {'get_by_id (us)':>16} {'page of 100 (us)':>18}")
+    for n in [100_000, 1_000_000]:
+        for name, repository_class in [("memory", InMemoryTasksRepository), ("columnar", ColumnarTasksRepository)]:
+            repository, mb, adds = bench_memory(repository_class, n)
+            lookup = bench_get_by_id(repository, n)
+            page = timeit.timeit(lambda: repository.get_all(limit=100, after_id=n // 2), number=100) / 100 * 1e6
+            print(f"{n:>10} {name:>10} {mb:>10.1f} {adds:>12.0f} {lookup:>16.2f} {page:>18.1f}")
+            del repository
+
+
+if __name__ == "__main__":
+    main()
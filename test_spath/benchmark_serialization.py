@@ -0,0 +1,43 @@
+"""
+Per-item cost of encoding list responses: FastAPI's default path
+(jsonable_encoder + JSONResponse) against FastJSONResponse.
+
+    python benchmark_serialization.py
+"""
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from repository import Task
+from repository_t import CustomerBase
+from responses import FastJSONResponse
+
+
+def default_response(content):
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_response(content):
+    return FastJSONResponse(content).body
+
+
+def per_item_us(render, content, n, number=5):
+    return timeit.timeit(lambda: render(content), number=number) / number / n * 1e6
+
+
+def main():
+    print(f"{'items':>8} {'kind':>10} {'default (us/item)':>18} {'fast (us/item)':>15}")
+    for n in [100, 1_000, 10_000]:
+        contents = {
+            "pydantic": {"tasks": [Task(id=i, name=f"Task {i}", status=bool(i % 2)) for i in range(n)]},
+            "orm": {"customers": [CustomerBase(id=i, name=f"customer {i}", email=f"sample{i}@gmail.com") for i in range(n)]},
+        }
+        for kind, content in contents.items():
+            default = per_item_us(default_response, content, n)
+            fast = per_item_us(fast_response, content, n)
+            print(f"{n:>8} {kind:>10} {default:>18.2f} {fast:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
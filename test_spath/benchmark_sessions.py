@@ -0,0 +1,50 @@
+"""
+Throughput of the SQL repositories the app serves requests with, as the
+number of concurrent clients grows. Each simulated request opens a session
+from the pooled async engine, reads a page of customers and closes it.
+
+    docker compose --env-file dev.env up -d
+    python benchmark_sessions.py
+    python benchmark_sessions.py --url sqlite+aiosqlite:///benchmark.db
+"""
+import argparse
+import asyncio
+import time
+
+import config
+from repository_t import AsyncPostgreSQLCustomerRepository, Customer, get_async_sessionmaker, init_async_db
+
+
+async def client(repository, requests):
+    for _ in range(requests):
+        await repository.get_all(limit=100)
+
+
+async def bench(repository, clients, requests_per_client):
+    start = time.perf_counter()
+    # gather raises the first failure, a run with errors reports no timing
+    await asyncio.gather(*(client(repository, requests_per_client) for _ in range(clients)))
+    return clients * requests_per_client / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=config.ASYNC_SQLALCHEMY_DATABASE_URL)
+    parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    args = parser.parse_args()
+
+    sessionmaker = get_async_sessionmaker(args.url)
+    await init_async_db(sessionmaker)
+    repository = AsyncPostgreSQLCustomerRepository(sessionmaker)
+    report = await repository.add_many(Customer(id=i, name=f"customer {i}", email=f"sample{i}@gmail.com") for i in range(4, 1000))
+    if report["failed"]:
+        raise SystemExit(f"Seeding failed: {report['errors']}")
+
+    print(f"{'clients':>8} {'req/s':>10}")
+    for clients in [1, 2, 4, 8, 16, 32]:
+        print(f"{clients:>8} {await bench(repository, clients, args.requests):>10.0f}")
+    await sessionmaker.kw["bind"].dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
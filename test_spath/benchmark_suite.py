@@ -0,0 +1,193 @@
+"""
+Micro-benchmarks of get_all, get_by_id and add on every repository backend,
+using local stand-ins so no database is needed: the in-memory and columnar
+task stores, MongoDBTasksRepository on mongomock, AsyncPostgreSQLCustomerRepository
+on SQLite (each call run to completion on a private loop) and
+MongoDBEventRepository (add only) on mongomock.
+
+Results are saved as JSON; pass a previous file with --compare to list
+operations that got slower.
+
+    python benchmark_suite.py
+    python benchmark_suite.py --sizes 100 1000000 --backends memory columnar
+    python benchmark_suite.py --output new.json --compare old.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime
+
+import mongomock
+from sqlalchemy import insert
+
+import repository
+from repository import ColumnarTasksRepository, InMemoryTasksRepository, MongoClientRegistry, MongoDBTasksRepository, Task
+from repository_t import AsyncPostgreSQLCustomerRepository, Customer, CustomerBase, MongoDBEventRepository, get_async_sessionmaker, init_async_db
+
+SIZES = [100, 1_000, 10_000]
+OPERATIONS = 200 # calls timed per get_by_id/add measurement
+
+
+def use_mongomock():
+    repository.MongoClient = mongomock.MongoClient
+    repository.mongo_clients = MongoClientRegistry()
+
+
+# Backends: fill(n) returns a repository holding n items with ids 1..n,
+# make(i) the item added by the add benchmark.
+
+def fill_memory(n):
+    tasks = InMemoryTasksRepository()
+    for i in range(4, n + 1):
+        tasks.add(Task(id=i, name=f"Task {i}", status=bool(i % 2)))
+    return tasks
+
+def fill_columnar(n):
+    tasks = ColumnarTasksRepository()
+    for i in range(4, n + 1):
+        tasks.add(Task(id=i, name=f"Task {i}", status=bool(i % 2)))
+    return tasks
+
+def fill_mongo(n):
+    use_mongomock()
+    tasks = MongoDBTasksRepository()
+    if n > 3:
+        tasks.collection.insert_many([{"id": i, "name": f"Task {i}", "status": bool(i % 2)} for i in range(4, n + 1)])
+    return tasks
+
+class RunToCompletion:
+    """Sync view of an async repository, so it is timed like the others."""
+
+    def __init__(self, repository, loop):
+        self.repository = repository
+        self.loop = loop
+
+    def get_all(self, limit=None, after_id=None):
+        return self.loop.run_until_complete(self.repository.get_all(limit, after_id))
+
+    def get_by_id(self, id):
+        return self.loop.run_until_complete(self.repository.get_by_id(id))
+
+    def add(self, item):
+        return self.loop.run_until_complete(self.repository.add(item))
+
+def fill_sqlite(n):
+    loop = asyncio.new_event_loop()
+    sessionmaker = get_async_sessionmaker("sqlite+aiosqlite:///:memory:")
+
+    async def fill():
+        await init_async_db(sessionmaker, seed=False)
+        async with sessionmaker() as db:
+            await db.execute(insert(CustomerBase), [{"id": i, "name": f"customer {i}", "email": f"sample{i}@gmail.com"} for i in range(1, n + 1)])
+            await db.commit()
+    loop.run_until_complete(fill())
+    return RunToCompletion(AsyncPostgreSQLCustomerRepository(sessionmaker), loop)
+
+def fill_events(n):
+    use_mongomock()
+    events = MongoDBEventRepository()
+    # mongomock's bulk_write rejects the UpdateOne pymongo builds, so the
+    # stats upserts are left out and only the event write path is timed
+    events.writer.on_written = None
+    events.collection.insert_many([
+        {"customer_id": i % 100, "plan_id": i % 2 + 1, "amount": 20.0, "timestamp": datetime(2025, 1, 1), "status": True}
+        for i in range(n)
+    ])
+    return events
+
+make_task = lambda i: Task(id=i, name=f"Task {i}", status=False)
+make_customer = lambda i: Customer(id=i, name=f"customer {i}", email=f"sample{i}@gmail.com")
+
+BACKENDS = {
+    "memory": (fill_memory, make_task, ["get_all", "get_by_id", "add"]),
+    "columnar": (fill_columnar, make_task, ["get_all", "get_by_id", "add"]),
+    "mongomock": (fill_mongo, make_task, ["get_all", "get_by_id", "add"]),
+    "sqlite": (fill_sqlite, make_customer, ["get_all", "get_by_id", "add"]),
+    "events": (fill_events, None, ["add"]),
+}
+
+
+def time_per_call(calls):
+    """Best of three runs, in microseconds per call."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for call in calls:
+            call()
+        best = min(best, time.perf_counter() - start)
+    return best / len(calls) * 1e6
+
+
+def bench(name, size):
+    fill, make, operations = BACKENDS[name]
+    store = fill(size)
+    results = {}
+    if "get_all" in operations:
+        results["get_all"] = time_per_call([store.get_all])
+    if "get_by_id" in operations:
+        ids = [random.randint(1, size) for _ in range(OPERATIONS)]
+        results["get_by_id"] = time_per_call([lambda x=x: store.get_by_id(x) for x in ids])
+    if name == "events":
+        calls = [lambda: store.add_event(1, 2, 20.0, datetime(2025, 1, 1), True) for _ in range(OPERATIONS)]
+        results["add"] = time_per_call(calls)
+        store.writer.flush()
+        store.close()
+    else:
+        # each run adds fresh ids, duplicates would be rejected
+        next_id = iter(range(size + 1, size + 1 + 3 * OPERATIONS))
+        results["add"] = time_per_call([lambda: store.add(make(next(next_id))) for _ in range(OPERATIONS)])
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous, threshold):
+    before = {(x["backend"], x["operation"], x["size"]): x["us_per_call"] for x in previous["results"]}
+    print(f"\nSlower than {previous.get('revision')} by more than {threshold:.0%}:")
+    regressions = 0
+    for x in results:
+        old = before.get((x["backend"], x["operation"], x["size"]))
+        if old and x["us_per_call"] > old * (1 + threshold):
+            regressions += 1
+            print(f"  {x['backend']} {x['operation']} n={x['size']}: {old:.2f} -> {x['us_per_call']:.2f} us")
+    if not regressions:
+        print("  none")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="previous results file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown reported by --compare")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'backend':>10} {'size':>9} {'operation':>10} {'us/call':>12}")
+    for name in args.backends:
+        for size in args.sizes:
+            for operation, us in bench(name, size).items():
+                results.append({"backend": name, "size": size, "operation": operation, "us_per_call": us})
+                print(f"{name:>10} {size:>9} {operation:>10} {us:>12.2f}")
+
+    with open(args.output, "w") as f:
+        json.dump({"revision": git_revision(), "python": platform.python_version(), "results": results}, f, indent=2)
+    print(f"\nSaved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f), args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Prepares the databases without starting the app: creates the tables and,
+unless --no-seed is given, resets the seed data. The app runs the same step
+in its lifespan (set SEED_ON_STARTUP=0 to skip seeding there).
+
+    python bootstrap.py [--no-seed]
+"""
+import argparse
+import asyncio
+
+import main
+
+
+async def run(seed):
+    await main.bootstrap(seed)
+    await main.sessionmaker.kw["bind"].dispose()
+    await main.mongo_clients.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-seed", action="store_true", help="only create the schema, keep existing data")
+    args = parser.parse_args()
+    asyncio.run(run(seed=not args.no_seed))
@@ -1,3 +1,5 @@
+import os
+
 # --- Configuration ---
 # NOTE: In a real FastAPI application, you would load these values from environment variables
 # or a configuration file (e.g., using Pydantic Settings).
@@ -15,5 +17,44 @@ POSTGRES_HOST = "localhost"
 POSTGRES_PORT = "5432"
 
 SQLALCHEMY_DATABASE_URL = (
-    f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-)
\ No newline at end of file
+    f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+)
+# Same database through the asyncpg driver, used by the async repositories
+ASYNC_SQLALCHEMY_DATABASE_URL = (
+    f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+)
+
+# Documents fetched per round trip when iterating Mongo cursors
+MONGO_BATCH_SIZE = 1000
+
+# Connection pool of the shared MongoClient (see repository.mongo_clients)
+MONGO_MAX_POOL_SIZE = 100
+MONGO_MIN_POOL_SIZE = 5
+
+# Payment events are written behind in batches of this size, or after this many seconds
+EVENT_BATCH_SIZE = 500
+EVENT_FLUSH_INTERVAL = 0.5
+# Events waiting in memory before add_event is refused (503 on /payments/simulate)
+EVENT_MAX_QUEUED = 50_000
+# A failed batch insert is retried this many times, waiting EVENT_RETRY_DELAY doubled each time (at most EVENT_MAX_RETRY_DELAY)
+EVENT_WRITE_RETRIES = 8
+EVENT_RETRY_DELAY = 0.2
+EVENT_MAX_RETRY_DELAY = 5.0
+
+# SQLAlchemy connection pool, shared by every session of the process
+DB_POOL_SIZE = 10
+DB_MAX_OVERFLOW = 20
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 1800 # seconds, drop connections before the server/firewall does
+DB_POOL_PRE_PING = True
+
+# Rows per transaction for bulk customer imports
+BULK_BATCH_SIZE = 5000
+STATS_COLLECTION_NAME = "payment_stats"
+
+# Encode large responses with orjson (responses.FastJSONResponse) instead of jsonable_encoder, opt-in with FAST_JSON_RESPONSES=1
+FAST_JSON_RESPONSES = os.environ.get("FAST_JSON_RESPONSES", "0") == "1"
+
+# Reset tables/collections to the seed data when the app starts (python bootstrap.py --no-seed skips it too)
+SEED_ON_STARTUP = os.environ.get("SEED_ON_STARTUP", "1") == "1"
+
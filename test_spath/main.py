@@ -1,9 +1,40 @@
-from fastapi import FastAPI
-from repository import get_repository, Task
+import asyncio
+from datetime import date
+import csv
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from responses import respond
+from metrics import metrics, MetricsMiddleware, CONTENT_TYPE, METRICS_ENABLED
+from repository import get_async_repository, AsyncCachedRepository, Task, mongo_clients
 from fastapi.middleware.cors import CORSMiddleware
-from repository_t import get_customer_repository,get_subscription_repository, Customer
-
-app = FastAPI()
+from repository_t import get_async_customer_repository, get_async_subscription_repository, get_async_sessionmaker, init_async_db, Customer, new_bulk_report, merge_bulk_reports
+import config
+
+# async engine/session factory shared by the SQL repositories, no connection until first use
+sessionmaker = get_async_sessionmaker()
+
+async def bootstrap(seed=config.SEED_ON_STARTUP):
+    """
+    All connection and schema work, kept out of import: opens the shared Mongo
+    pool, creates the SQL tables and, when seeding, resets seed data and events.
+    """
+    mongo_available = await asyncio.to_thread(mongo_clients.warm_up)
+    await init_async_db(sessionmaker, seed)
+    if seed and mongo_available:
+        await asyncio.to_thread(event_repo.reset)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await bootstrap()
+    yield
+    await sessionmaker.kw["bind"].dispose()
+    # write out buffered payment events before the Mongo pool goes away
+    await asyncio.to_thread(event_repo.close)
+    await mongo_clients.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Handle CORS in local dev
 origins= [
@@ -16,55 +47,191 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
+# outermost, so CORS preflights and routing are part of the measured latency
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 
 @app.get("/")
 def root():
     return {"message": "Hello World"}
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text format, empty when METRICS_ENABLED is off."""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+@app.get("/stats/mongo")
+def get_mongo_stats():
+    return {"pools": mongo_clients.stats()}
+
 # repository
-repository = get_repository()
+repository = get_async_repository()
+
+async def stream_tasks(after_id=None, page_size=1000):
+    """Yields every task as NDJSON, walking the repository page by page."""
+    while True:
+        page = await repository.get_all(limit=page_size, after_id=after_id)
+        for task in page:
+            yield task.model_dump_json() + "\n"
+        if len(page) < page_size:
+            return
+        after_id = page[-1].id
+
 
 @app.get("/tasks")
-def get_tasks():
-    return {"tasks": repository.get_all()}
+async def get_tasks(limit: int = Query(100, ge=1, le=1000), after_id: int | None = None, format: str = "json"):
+    # format=ndjson streams a full export starting after `after_id`
+    if format == "ndjson":
+        return StreamingResponse(stream_tasks(after_id), media_type="application/x-ndjson")
+    tasks = await repository.get_all(limit=limit, after_id=after_id)
+    next_after_id = tasks[-1].id if len(tasks) == limit else None
+    return respond({"tasks": tasks, "next_after_id": next_after_id})
 
 
 @app.post("/tasks")
-def add_task(new_task: Task):
-    repository.add(new_task)
-    return {"message": repository.get_all()}
+async def add_task(new_task: Task):
+    try:
+        await repository.add(new_task)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"task": new_task}
     
 
 @app.post("/tasks/{id}/")
-def update_task_status(id: int):
-    item = repository.get_by_id(id)
-    item.status = not (item.status)
+async def update_task_status(id: int):
+    # a single repository operation, a read then a write could lose parallel toggles
+    item = await repository.toggle_status(id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Task not found")
     return {"task": item}
 
-customer_repository = get_customer_repository()
+# customers rarely change, reads are served from a short-lived cache
+customer_repository = AsyncCachedRepository(get_async_customer_repository(sessionmaker), maxsize=256, ttl=10.0)
 @app.get("/customers")
-def get_customers():
-    return {"customers": customer_repository.get_all()}
+async def get_customers():
+    return respond({"customers": await customer_repository.get_all()})
 
 
 @app.post("/customers")
-def add_customer(new_item: Customer):
-    customer_repository.add(new_item)
-    return {"message": customer_repository.get_all()}
+async def add_customer(new_item: Customer):
+    await customer_repository.add(new_item)
+    return respond({"message": await customer_repository.get_all()})
+
+
+async def read_lines(stream):
+    """Splits a streamed request body into lines (bytes) without loading all of it."""
+    pending = b""
+    async for chunk in stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+async def read_records(stream, is_csv):
+    """
+    Yields (line_number, record) per record of a streamed body, records still
+    undecoded. A quoted CSV field may span lines, so CSV lines are joined until
+    their quotes balance; line_number is the line the record starts on.
+    """
+    record = None
+    quotes = start = line_number = 0
+    async for line in read_lines(stream):
+        line_number += 1
+        if record is None:
+            record, start = line, line_number
+        else:
+            record += b"\n" + line
+        # '"' never occurs inside a multi-byte utf-8 sequence, counting bytes is safe
+        quotes += line.count(b'"')
+        if is_csv and quotes % 2:
+            continue
+        yield start, record
+        record, quotes = None, 0
+    if record is not None:
+        yield start, record
+
+def parse_csv_record(text):
+    return next(csv.reader(text.splitlines(keepends=True)))
+
+@app.post("/customers/bulk")
+async def add_customers_bulk(request: Request):
+    """
+    Imports customers from a streamed CSV (text/csv, header id,name,email) or
+    NDJSON body, writing BULK_BATCH_SIZE rows per batch as they arrive. Lines
+    that can't be decoded or validated are listed in invalid_lines.
+    """
+    is_csv = request.headers.get("content-type", "").startswith("text/csv")
+    report = new_bulk_report()
+    report["invalid_lines"] = []
+    header = None
+    batch = []
+    async for line_number, record in read_records(request.stream(), is_csv):
+        if not record.strip():
+            continue
+        try:
+            text = record.decode()
+            if is_csv and header is None:
+                header = parse_csv_record(text)
+                continue
+            fields = dict(zip(header, parse_csv_record(text))) if is_csv else json.loads(text)
+            batch.append(Customer.model_validate(fields))
+        except (ValueError, csv.Error) as e: # UnicodeDecodeError is a ValueError
+            report["invalid_lines"].append({"line": line_number, "error": str(e).splitlines()[0]})
+            continue
+        if len(batch) >= config.BULK_BATCH_SIZE:
+            merge_bulk_reports(report, await customer_repository.add_many(batch))
+            batch = []
+    if batch:
+        merge_bulk_reports(report, await customer_repository.add_many(batch))
+    return report
+
+subscriptions_repository = get_async_subscription_repository(sessionmaker)
+@app.get("/subscriptions")
+async def get_subscriptions(limit: int = Query(100, ge=1, le=1000), after_id: int | None = None, customer_id: int | None = None, plan_id: int | None = None):
+    subscriptions = await subscriptions_repository.list_views(limit, after_id, customer_id, plan_id)
+    next_after_id = subscriptions[-1].id if len(subscriptions) == limit else None
+    return respond({"subscriptions": subscriptions, "next_after_id": next_after_id})
 
-subscriptions_repository = get_subscription_repository()
 @app.post("/subscriptions")
-def subscribe_customer(customer_id: int, plan_id:int ):
-    subscriptions_repository.subscribe(customer_id, plan_id)
-    return {"message": subscriptions_repository.get_all()}
+async def subscribe_customer(customer_id: int, plan_id:int ):
+    item = await subscriptions_repository.subscribe(customer_id, plan_id)
+    return {"subscription": {"id": item.id, "customer_id": item.customer_id, "plan_id": item.plan_id, "start_date": item.start_date, "end_date": item.end_date, "status": item.status}}
 
 
-from repository_t import MongoDBEventRepository
-event_repo = MongoDBEventRepository()            
+from repository_t import MongoDBEventRepository, EventQueueFull
+event_repo = MongoDBEventRepository()
 @app.post("/payments/simulate")
-def subscribe_customer(customer_id: int, plan_id:int , amount:float):
+async def subscribe_customer(customer_id: int, plan_id:int , amount:float):
     from datetime import datetime
     timestamp =datetime.now()
     status=True
-    event_repo.add_event(customer_id, plan_id, amount, timestamp, status)
+    try:
+        event_repo.add_event(customer_id, plan_id, amount, timestamp, status)
+    except EventQueueFull as e:
+        # writes are backed up (Mongo down or slow), the client should retry later
+        raise HTTPException(status_code=503, detail=str(e))
     return {"message": "payment succesful"}
+
+@app.get("/payments/stats")
+def get_payment_stats(plan_id: int | None = None, customer_id: int | None = None, day: date | None = None):
+    """
+    Counters of successful payments: per plan, per customer, per day, or per plan and day.
+    Counts lag ingestion by at most one event batch flush.
+    """
+    if customer_id is not None and plan_id is None and day is None:
+        key = f"customer:{customer_id}"
+    elif plan_id is not None and customer_id is None:
+        key = f"plan:{plan_id}" if day is None else f"plan_day:{plan_id}:{day.isoformat()}"
+    elif day is not None and plan_id is None and customer_id is None:
+        key = f"day:{day.isoformat()}"
+    else:
+        raise HTTPException(status_code=400, detail="Use one of customer_id, plan_id, day or plan_id with day")
+    return {"key": key, **event_repo.stats.get(key)}
+
+@app.post("/payments/stats/rebuild")
+def rebuild_payment_stats():
+    """Recomputes the counters from the raw events, payments arriving meanwhile are counted after it."""
+    return {"counters": event_repo.rebuild_stats()}
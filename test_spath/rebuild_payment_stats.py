@@ -0,0 +1,24 @@
+"""
+Recomputes the payment counters behind /payments/stats from the raw events,
+e.g. after a backfill or importing historical payments:
+
+    python rebuild_payment_stats.py
+
+Payments the app counts while this runs are lost, so stop ingestion first or
+use POST /payments/stats/rebuild, which pauses the app's event writer instead.
+"""
+import config
+from repository import mongo_clients
+from repository_t import PaymentStatsRepository
+
+
+def main():
+    if not mongo_clients.warm_up():
+        return
+    db = mongo_clients.get()[config.DATABASE_NAME]
+    stats = PaymentStatsRepository(db[config.STATS_COLLECTION_NAME])
+    print(f"Rebuilt {stats.rebuild(db[config.COLLECTION_NAME])} counters.")
+
+
+if __name__ == "__main__":
+    main()
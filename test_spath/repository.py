@@ -1,17 +1,34 @@
 
+import bisect
+import re
+import threading
+import time
+from collections import OrderedDict
+from array import array
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List
 from pydantic import BaseModel
 
 from abc import ABC, abstractmethod
 
+from metrics import time_methods
+
 class Item(BaseModel):
     pass
 
 # Repository Interface
 class Repository(ABC):
+    def __init_subclass__(cls, **kwargs):
+        # every implementation gets its method calls timed (see metrics.py)
+        super().__init_subclass__(**kwargs)
+        time_methods(cls)
+
     @abstractmethod
-    def get_all(self, id: int) -> Item | None:
+    def get_all(self, limit: int | None = None, after_id: int | None = None) -> List[Item]:
+        """
+        Returns all items, or one page of items ordered by id when limit/after_id
+        are given. after_id is the keyset cursor: the last id of the previous page.
+        """
         pass
     
     @abstractmethod
@@ -22,55 +39,563 @@ class Repository(ABC):
     def get_by_id(self, id: int) -> Item | None:
         pass
 
+# Async Repository Interface, same contract as Repository for non-blocking backends
+class AsyncRepository(ABC):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        time_methods(cls)
+
+    @abstractmethod
+    async def get_all(self, limit: int | None = None, after_id: int | None = None) -> List[Item]:
+        pass
+
+    @abstractmethod
+    async def add(self, item: Item):
+        pass
+
+    @abstractmethod
+    async def get_by_id(self, id: int) -> Item | None:
+        pass
+
 class Task(Item):
     id : int
     name: str
     status: bool
 
 class InMemoryTasksRepository(Repository):
-    tasks: List[str]
-    
+    # primary index id -> task, dicts keep insertion order so get_all is stable
+    tasks: Dict[int, Task]
+    # secondary index status -> ids (dict used as an insertion-ordered set)
+    tasks_by_status: Dict[bool, Dict[int, None]]
+    # ids kept sorted for keyset pagination
+    sorted_ids: List[int]
+
     def __init__(self):
-        self.tasks = [
-            Task(id=1,name="My first task", status=False), 
-            Task(id=2,name="My second task",status=False), 
+        self.tasks = {}
+        self.tasks_by_status = {True: {}, False: {}}
+        self.sorted_ids = []
+        for task in [
+            Task(id=1,name="My first task", status=False),
+            Task(id=2,name="My second task",status=False),
             Task(id=3,name="My third task", status=False)
-        ]
+        ]:
+            self.add(task)
+
+    def get_all(self, limit=None, after_id=None):
+        if limit is None and after_id is None:
+            return list(self.tasks.values())
+        start = 0 if after_id is None else bisect.bisect_right(self.sorted_ids, after_id)
+        while True:
+            ids = self.sorted_ids[start:None if limit is None else start + limit]
+            # smaller ids inserted since the bisect shift the list right, step past them
+            skip = 0 if after_id is None else bisect.bisect_right(ids, after_id)
+            if not skip:
+                return [self.tasks[x] for x in ids]
+            start += skip
 
-    def get_all(self):
-        return self.tasks
-    
     def add(self, task: Task):
-        self.tasks.append(task)
+        self.insert(task)
+
+    def insert(self, task: Task):
+        if task.id in self.tasks:
+            raise ValueError(f"Task with id {task.id} already exists")
+        self.tasks[task.id] = task
+        self.tasks_by_status[task.status][task.id] = None
+        bisect.insort(self.sorted_ids, task.id)
 
     def get_by_id(self, id):
-        for x in self.tasks:
-            if x.id == id:
-                return x
+        return self.tasks.get(id)
+
+    def get_by_status(self, status: bool):
+        return [self.tasks[x] for x in self.tasks_by_status[status]]
+
+    def set_status(self, id, status: bool):
+        # status must change through the repository to keep the index in sync
+        task = self.tasks.get(id)
+        if task is None:
+            return None
+        del self.tasks_by_status[task.status][id]
+        task.status = status
+        self.tasks_by_status[status][id] = None
+        return task
+
+    def toggle_status(self, id):
+        task = self.tasks.get(id)
+        return None if task is None else self.set_status(id, not task.status)
+
+
+class ConcurrentTasksRepository(InMemoryTasksRepository):
+    """
+    Thread-safe InMemoryTasksRepository: writers are serialized by a lock,
+    readers never lock and build their result from one copy of an index.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        super().__init__()
+
+    def add(self, task: Task):
+        with self.lock:
+            self.insert(task)
+
+    def get_by_status(self, status: bool):
+        ids = list(self.tasks_by_status[status])
+        # a task may have changed status since the copy, those are left out
+        return [task for task in map(self.tasks.__getitem__, ids) if task.status == status]
+
+    def set_status(self, id, status: bool):
+        with self.lock:
+            return self.write_status(id, lambda task: status)
+
+    def toggle_status(self, id):
+        """Flips status atomically, parallel toggles of the same task are never lost."""
+        with self.lock:
+            return self.write_status(id, lambda task: not task.status)
+
+    def write_status(self, id, new_status):
+        # caller holds the lock
+        task = self.tasks.get(id)
+        if task is None:
+            return None
+        status = new_status(task)
+        updated = task.model_copy(update={"status": status})
+        self.tasks[id] = updated
+        if status != task.status:
+            self.tasks_by_status[status][id] = None
+            del self.tasks_by_status[task.status][id]
+        return updated
+
+
+class ColumnarTasksRepository(Repository):
+    """
+    Compact task store for millions of tasks. Columns live in flat arrays and
+    Task models are only built when returned, so mutating a returned task does
+    not change the store (use set_status).
+    - ids: int64 array, one entry per row
+    - status: packed bitset, one bit per row
+    - names: utf-8 bytes in one buffer, row i spans name_offsets[i]:name_offsets[i+1]
+    While ids arrive in ascending order lookups bisect the id column, otherwise
+    an id -> row dict is built once and kept up to date.
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.status_bits = bytearray()
+        self.names = bytearray()
+        self.name_offsets = array("Q", [0])
+        self.row_by_id = None
+        self.sorted_rows = None
+        for task in [
+            Task(id=1,name="My first task", status=False),
+            Task(id=2,name="My second task",status=False),
+            Task(id=3,name="My third task", status=False)
+        ]:
+            self.add(task)
+
+    def get_all(self, limit=None, after_id=None):
+        if limit is None and after_id is None:
+            return [self.build_task(x) for x in range(len(self.ids))]
+        if self.row_by_id is None:
+            # rows are already in id order
+            rows = range(len(self.ids))
+            start = 0 if after_id is None else bisect.bisect_right(self.ids, after_id)
+        else:
+            if self.sorted_rows is None:
+                self.sorted_rows = array("Q", sorted(range(len(self.ids)), key=self.ids.__getitem__))
+            rows = self.sorted_rows
+            start = 0 if after_id is None else bisect.bisect_right(rows, after_id, key=self.ids.__getitem__)
+        end = len(rows) if limit is None else start + limit
+        return [self.build_task(x) for x in rows[start:end]]
+
+    def add(self, task: Task):
+        if self.find_row(task.id) is not None:
+            raise ValueError(f"Task with id {task.id} already exists")
+        row = len(self.ids)
+        if self.row_by_id is None and row and task.id < self.ids[-1]:
+            self.row_by_id = {x: i for i, x in enumerate(self.ids)}
+        if self.row_by_id is not None:
+            self.row_by_id[task.id] = row
+        self.ids.append(task.id)
+        if row % 8 == 0:
+            self.status_bits.append(0)
+        self.write_status(row, task.status)
+        self.names += task.name.encode()
+        self.name_offsets.append(len(self.names))
+        self.sorted_rows = None
+
+    def get_by_id(self, id):
+        row = self.find_row(id)
+        return None if row is None else self.build_task(row)
+
+    def get_by_status(self, status: bool):
+        return [self.build_task(x) for x in range(len(self.ids)) if self.read_status(x) == status]
+
+    def set_status(self, id, status: bool):
+        row = self.find_row(id)
+        if row is None:
+            return None
+        self.write_status(row, status)
+        return self.build_task(row)
+
+    def toggle_status(self, id):
+        row = self.find_row(id)
+        if row is None:
+            return None
+        self.write_status(row, not self.read_status(row))
+        return self.build_task(row)
+
+    def find_row(self, id):
+        if self.row_by_id is not None:
+            return self.row_by_id.get(id)
+        row = bisect.bisect_left(self.ids, id)
+        if row < len(self.ids) and self.ids[row] == id:
+            return row
         return None
 
+    def read_status(self, row):
+        return bool(self.status_bits[row >> 3] >> (row & 7) & 1)
+
+    def write_status(self, row, status: bool):
+        if status:
+            self.status_bits[row >> 3] |= 1 << (row & 7)
+        else:
+            self.status_bits[row >> 3] &= ~(1 << (row & 7)) & 0xFF
+
+    def build_task(self, row):
+        name = self.names[self.name_offsets[row]:self.name_offsets[row + 1]].decode()
+        return Task(id=self.ids[row], name=name, status=self.read_status(row))
+
+
+class AsyncInMemoryTasksRepository(AsyncRepository):
+    """Async facade over an in-memory repository, operations never block so they run inline."""
+
+    def __init__(self, repository: InMemoryTasksRepository | ConcurrentTasksRepository | None = None):
+        self.repository = repository or InMemoryTasksRepository()
+
+    async def get_all(self, limit=None, after_id=None):
+        return self.repository.get_all(limit, after_id)
+
+    async def add(self, task: Task):
+        self.repository.add(task)
+
+    async def get_by_id(self, id):
+        return self.repository.get_by_id(id)
+
+    async def set_status(self, id, status: bool):
+        return self.repository.set_status(id, status)
+
+    async def toggle_status(self, id):
+        return self.repository.toggle_status(id)
+
 
 get_repository = lambda : InMemoryTasksRepository()
+get_async_repository = lambda : AsyncInMemoryTasksRepository()
+
+# Caching
+
+class LRUCache:
+    """
+    Bounded LRU cache with a per-entry TTL and hit/miss counters. clear()
+    bumps `generation`; a fill computed under an older generation is dropped,
+    so a read that started before an invalidation can't store stale data.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns (True, value) on a fresh hit, (False, None) otherwise."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, generation=None):
+        """Stores value unless the cache was cleared since `generation` was read."""
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (self.clock() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+
+class CachedRepository(Repository):
+    """
+    Read-through cache around any Repository. get_all/get_by_id results are
+    cached, any write (add, add_many, subscribe, set_status, toggle_status) drops the whole cache since
+    one write can change every cached page. Other attributes are delegated.
+    """
+
+    def __init__(self, repository: Repository, maxsize=1024, ttl=30.0, clock=time.monotonic):
+        self.repository = repository
+        self.cache = LRUCache(maxsize, ttl, clock)
+
+    def get_all(self, limit=None, after_id=None):
+        hit, value = self.cache.get(("get_all", limit, after_id))
+        if not hit:
+            # read before the backend call, an add racing this read invalidates the fill
+            generation = self.cache.generation
+            value = self.repository.get_all(limit=limit, after_id=after_id)
+            self.cache.set(("get_all", limit, after_id), value, generation)
+        return value
+
+    def get_by_id(self, id):
+        hit, value = self.cache.get(("get_by_id", id))
+        if not hit:
+            generation = self.cache.generation
+            value = self.repository.get_by_id(id)
+            self.cache.set(("get_by_id", id), value, generation)
+        return value
+
+    def add(self, item: Item):
+        try:
+            return self.repository.add(item)
+        finally:
+            self.cache.clear()
+
+    def subscribe(self, *args, **kwargs):
+        try:
+            return self.repository.subscribe(*args, **kwargs)
+        finally:
+            self.cache.clear()
+
+    def add_many(self, *args, **kwargs):
+        try:
+            return self.repository.add_many(*args, **kwargs)
+        finally:
+            self.cache.clear()
+
+    def set_status(self, *args, **kwargs):
+        try:
+            return self.repository.set_status(*args, **kwargs)
+        finally:
+            self.cache.clear()
+
+    def toggle_status(self, *args, **kwargs):
+        try:
+            return self.repository.toggle_status(*args, **kwargs)
+        finally:
+            self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+
+class AsyncCachedRepository(AsyncRepository):
+    """Same as CachedRepository for an AsyncRepository."""
+
+    def __init__(self, repository: AsyncRepository, maxsize=1024, ttl=30.0, clock=time.monotonic):
+        self.repository = repository
+        self.cache = LRUCache(maxsize, ttl, clock)
+
+    async def get_all(self, limit=None, after_id=None):
+        hit, value = self.cache.get(("get_all", limit, after_id))
+        if not hit:
+            generation = self.cache.generation
+            value = await self.repository.get_all(limit=limit, after_id=after_id)
+            self.cache.set(("get_all", limit, after_id), value, generation)
+        return value
+
+    async def get_by_id(self, id):
+        hit, value = self.cache.get(("get_by_id", id))
+        if not hit:
+            generation = self.cache.generation
+            value = await self.repository.get_by_id(id)
+            self.cache.set(("get_by_id", id), value, generation)
+        return value
+
+    async def add(self, item: Item):
+        try:
+            return await self.repository.add(item)
+        finally:
+            self.cache.clear()
+
+    async def subscribe(self, *args, **kwargs):
+        try:
+            return await self.repository.subscribe(*args, **kwargs)
+        finally:
+            self.cache.clear()
+
+    async def add_many(self, *args, **kwargs):
+        try:
+            return await self.repository.add_many(*args, **kwargs)
+        finally:
+            self.cache.clear()
+
+    async def set_status(self, *args, **kwargs):
+        try:
+            return await self.repository.set_status(*args, **kwargs)
+        finally:
+            self.cache.clear()
+
+    async def toggle_status(self, *args, **kwargs):
+        try:
+            return await self.repository.toggle_status(*args, **kwargs)
+        finally:
+            self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
 
 # NoSql Repo
 
 import config 
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient, ReturnDocument, monitoring
+from pymongo.errors import DuplicateKeyError
 from bson.objectid import ObjectId
 from bson.json_util import dumps # Used to correctly serialize ObjectId for printing
 
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events of one client."""
+
+    def __init__(self):
+        self.created = 0
+        self.closed = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+
+    def connection_created(self, event):
+        self.created += 1
+
+    def connection_closed(self, event):
+        self.closed += 1
+
+    def connection_checked_out(self, event):
+        self.in_use += 1
+        self.checkouts += 1
+
+    def connection_checked_in(self, event):
+        self.in_use -= 1
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def stats(self):
+        return {
+            "open": self.created - self.closed,
+            "in_use": self.in_use,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+        }
+
+
+class MongoClientRegistry:
+    """
+    Process-wide MongoDB clients, one per (kind, uri). Every repository gets
+    the same client and so shares one connection pool. Clients are created
+    with connect=False, so neither monitor threads nor sockets exist until the
+    first operation; warm_up/close are meant for app startup/shutdown.
+    """
+
+    def __init__(self, max_pool_size=config.MONGO_MAX_POOL_SIZE, min_pool_size=config.MONGO_MIN_POOL_SIZE):
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.clients = {}
+        self.listeners = {}
+        self.lock = threading.Lock()
+
+    def get(self, uri=config.MONGO_URI, kind="sync"):
+        key = (kind, uri)
+        with self.lock:
+            if key not in self.clients:
+                client_class = MongoClient if kind == "sync" else AsyncMongoClient
+                self.listeners[key] = PoolStatsListener()
+                self.clients[key] = client_class(
+                    uri,
+                    maxPoolSize=self.max_pool_size,
+                    minPoolSize=self.min_pool_size,
+                    event_listeners=[self.listeners[key]],
+                    connect=False,
+                )
+            return self.clients[key]
+
+    def get_async(self, uri=config.MONGO_URI):
+        return self.get(uri, kind="async")
+
+    def warm_up(self, uri=config.MONGO_URI):
+        """Opens the pool and verifies the connection, returns False if Mongo is unreachable."""
+        try:
+            # The ping command is a lightweight way to verify a connection
+            self.get(uri).admin.command('ping')
+            print("MongoDB connection successful!")
+            return True
+        except Exception as e:
+            print(f"Error connecting to MongoDB: {e}")
+            return False
+
+    async def close(self):
+        with self.lock:
+            clients = list(self.clients.items())
+            self.clients.clear()
+            self.listeners.clear()
+        for (kind, _), client in clients:
+            if kind == "async":
+                await client.close()
+            else:
+                client.close()
+
+    def stats(self):
+        # credentials are stripped from the uri used as key
+        return {
+            f"{kind}:{re.sub(r'//[^@/]*@', '//', uri)}": listener.stats()
+            for (kind, uri), listener in self.listeners.items()
+        }
+
+
+mongo_clients = MongoClientRegistry()
+
 def get_mongo_client():
-    """Establishes and returns a MongoDB client connection."""
-    try:
-        client = MongoClient(config.MONGO_URI)
-        # The ismaster command is a lightweight way to verify a connection
-        client.admin.command('ping')
-        print("MongoDB connection successful!")
-        return client
-    except Exception as e:
-        print(f"Error connecting to MongoDB: {e}")
-        # In a real app, you would raise an exception or handle the error gracefully
-        return None
+    """Returns the shared MongoDB client, see MongoClientRegistry."""
+    return mongo_clients.get()
+
+# Only the Task fields are fetched, _id is never sent back
+TASK_PROJECTION = {"_id": 0, "id": 1, "name": 1, "status": 1}
+# update pipeline flipping status from its current value
+TOGGLE_STATUS = [{"$set": {"status": {"$not": "$status"}}}]
+
+def ensure_task_indexes(collection):
+    """
+    Unique index on task id. Sparse, because payment events share the
+    collection and have no id field.
+    """
+    return collection.create_index("id", unique=True, sparse=True)
 
 
 class MongoDBTasksRepository(Repository):
@@ -78,7 +603,8 @@ class MongoDBTasksRepository(Repository):
     #collection
     #tasks: List[str]
     
-    def __init__(self):
+    def __init__(self, batch_size=config.MONGO_BATCH_SIZE):
+        self.batch_size = batch_size
         self.client = get_mongo_client()
         if not self.client:
             print("Cannot proceed without a database connection. Please ensure Docker/Db is running.")
@@ -90,6 +616,7 @@ class MongoDBTasksRepository(Repository):
         # Clear previous data 
         self.collection.delete_many({})
         #print(f"\n--- Cleared all items from '{COLLECTION_NAME}' collection. ---\n")
+        ensure_task_indexes(self.collection)
 
         initial_items = [
             {"id":1 ,"name":"My first task", "status":False},
@@ -100,15 +627,26 @@ class MongoDBTasksRepository(Repository):
         #print(f"1. Added {len(result_many.inserted_ids)} initial items. IDs: {result_many.inserted_ids}")
     
 
-    def get_all(self):
-        all_items_cursor = self.collection.find()
-        # Use dumps to serialize the MongoDB documents (including ObjectIds) to JSON string for readable output
-        # print(dumps(list(all_items_cursor), indent=2))
-        return [self.custom_serializer(x) for x in all_items_cursor]
+    def get_all(self, limit=None, after_id=None):
+        return list(self.iter_all(limit, after_id))
+
+    def iter_all(self, limit=None, after_id=None):
+        """Lazily yields tasks, fetching batch_size documents per round trip."""
+        query = {"id": {"$exists": True}} if after_id is None else {"id": {"$gt": after_id}}
+        all_items_cursor = self.collection.find(query, TASK_PROJECTION, batch_size=self.batch_size)
+        if limit is not None or after_id is not None:
+            all_items_cursor = all_items_cursor.sort("id", 1)
+        if limit is not None:
+            all_items_cursor = all_items_cursor.limit(limit)
+        for x in all_items_cursor:
+            yield self.custom_serializer(x)
     
     def add(self, task: Task):
         single_item = {"id":task.id ,"name":task.name, "status":task.status}
-        result_one = self.collection.insert_one(single_item)
+        try:
+            result_one = self.collection.insert_one(single_item)
+        except DuplicateKeyError:
+            raise ValueError(f"Task with id {task.id} already exists")
         #print(f"\n2. Added a single item. ID: {result_one.inserted_id}")
         #self.tasks.append(task)
 
@@ -118,9 +656,8 @@ class MongoDBTasksRepository(Repository):
         
         try:
             # We must convert the string ID to an ObjectId object for MongoDB to query correctly
-            query_result = self.collection.find_one({"id": id})
+            query_result = self.collection.find_one({"id": id}, TASK_PROJECTION)
             if query_result:
-                print(dumps(query_result, indent=2))
                 return self.custom_serializer(query_result)
             else:
                 return None
@@ -128,6 +665,15 @@ class MongoDBTasksRepository(Repository):
         except Exception as e:
             print(f"Error finding item by ID: {e}")
 
+    def set_status(self, id, status: bool):
+        self.collection.update_one({"id": id}, {"$set": {"status": status}})
+        return self.get_by_id(id)
+
+    def toggle_status(self, id):
+        # pipeline update, the flip happens server side in one atomic write
+        task = self.collection.find_one_and_update({"id": id}, TOGGLE_STATUS, TASK_PROJECTION, return_document=ReturnDocument.AFTER)
+        return None if task is None else self.custom_serializer(task)
+
     def custom_serializer(self, task_data):
         #task_date={\"_id\": {\"$oid\": \"690bafb9d98fa236275529cf\"}, \"id\": 1, \"name\": \"My first task\", \"status\": false},
         id = task_data.get("id", -1)
@@ -135,7 +681,62 @@ class MongoDBTasksRepository(Repository):
         status = task_data.get("status", 0)
         return Task(id=id, name=name, status=status)
 
+class AsyncMongoDBTasksRepository(AsyncRepository):
+    """
+    Non-blocking counterpart of MongoDBTasksRepository. A collection can be
+    injected (e.g. an async fake in tests), otherwise one is opened lazily from config.
+    """
+
+    def __init__(self, collection=None, batch_size=config.MONGO_BATCH_SIZE):
+        if collection is None:
+            client = mongo_clients.get_async()
+            collection = client[config.DATABASE_NAME][config.COLLECTION_NAME]
+        self.collection = collection
+        self.batch_size = batch_size
+
+    async def ensure_indexes(self):
+        await ensure_task_indexes(self.collection)
+
+    async def seed(self):
+        await self.collection.delete_many({})
+        await self.ensure_indexes()
+        await self.collection.insert_many([
+            {"id":1 ,"name":"My first task", "status":False},
+            {"id":2 ,"name":"My second task", "status":False},
+            {"id":3 ,"name":"My third task", "status":False}
+        ])
+
+    async def get_all(self, limit=None, after_id=None):
+        query = {"id": {"$exists": True}} if after_id is None else {"id": {"$gt": after_id}}
+        all_items_cursor = self.collection.find(query, TASK_PROJECTION, batch_size=self.batch_size)
+        if limit is not None or after_id is not None:
+            all_items_cursor = all_items_cursor.sort("id", 1)
+        if limit is not None:
+            all_items_cursor = all_items_cursor.limit(limit)
+        return [self.custom_serializer(x) async for x in all_items_cursor]
+
+    async def add(self, task: Task):
+        try:
+            await self.collection.insert_one({"id":task.id ,"name":task.name, "status":task.status})
+        except DuplicateKeyError:
+            raise ValueError(f"Task with id {task.id} already exists")
+
+    async def get_by_id(self, id):
+        query_result = await self.collection.find_one({"id": id}, TASK_PROJECTION)
+        return self.custom_serializer(query_result) if query_result else None
+
+    async def set_status(self, id, status: bool):
+        await self.collection.update_one({"id": id}, {"$set": {"status": status}})
+        return await self.get_by_id(id)
+
+    async def toggle_status(self, id):
+        task = await self.collection.find_one_and_update({"id": id}, TOGGLE_STATUS, TASK_PROJECTION, return_document=ReturnDocument.AFTER)
+        return None if task is None else self.custom_serializer(task)
+
+    custom_serializer = MongoDBTasksRepository.custom_serializer
+
 # get_repository = lambda : MongoDBTasksRepository()
+# get_async_repository = lambda : AsyncCachedRepository(AsyncMongoDBTasksRepository())
 
 # get_repository = lambda : PostgreSQLTasksRepository()
 
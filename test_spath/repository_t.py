@@ -1,13 +1,16 @@
 
 import os
 from typing import List, Optional
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, Date, or_, ForeignKey
+from itertools import islice
+from datetime import date
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, Date, Index, or_, ForeignKey, select, delete, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session,relationship
+from sqlalchemy.orm import sessionmaker, Session,relationship, joinedload
 from sqlalchemy.exc import OperationalError
 from pydantic import BaseModel
 import config
-from repository import Repository
+from repository import Repository, AsyncRepository
 
 class Item(BaseModel):
     pass
@@ -17,6 +20,20 @@ class Customer(Item):
     name: str
     email: str
 
+class PlanSummary(Item):
+    id : int
+    name: str
+    billing_cycle: str
+
+class SubscriptionView(Item):
+    """Read model returned by the subscription listing, instead of ORM rows."""
+    id : int
+    start_date: date | None
+    end_date: date | None
+    status: bool | None
+    customer: Customer
+    plan: PlanSummary
+
 # Base class for declarative table definition
 Base = declarative_base()
 
@@ -67,128 +84,431 @@ class SubscriptionBase(Base):
 
     plan = relationship("SubscriptionPlanBase")
 
-# --- Database Engine and Session Setup ---
-try:
-    # Create the SQLAlchemy engine. 'echo=True' prints SQL statements to the console.
-    engine = create_engine(config.SQLALCHEMY_DATABASE_URL, echo=False)
-
-    # Create a configured "Session" class
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-    # Create all defined tables in the database (only if they don't exist)
-    Base.metadata.create_all(bind=engine)
-    print("PostgreSQL Engine and table creation successful.")
-    
-except OperationalError as e:
-    print(f"\nFATAL: Could not connect to PostgreSQL. Is Docker running?")
-    print(f"Connection Error: {e}\n")
-    engine = None # Ensure engine is None if connection fails
-# --- CRUD Operations ---
-
-def get_db():
-    """Dependency that creates a new session and ensures it's closed."""
-    if not engine:
-        raise ConnectionError("Database connection failed during startup.")
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-class PostgreSQLCustomerRepository(Repository):
-    def __init__(self):    
-        # Use the generator function to safely get and close the session
-        db_generator = get_db()
-        db = next(db_generator) # Get the session instance
-    
-        # 1. Clear and Add Multiple Items
-        db.query(SubscriptionBase).delete()
-        db.query(CustomerBase).delete()
-        db.query(SubscriptionPlanBase).delete()
-        db.commit()
-
-        import random
-        items = [
-            CustomerBase(id=1,name="alfa", email="sample1@gmail.com"), 
-            CustomerBase(id=2,name="beta", email="sample2@gmail.com"), 
+    # keyset pagination filtered by customer or plan walks these in id order
+    __table_args__ = (
+        Index("ix_subscriptions_customer_id_id", "customer_id", "id"),
+        Index("ix_subscriptions_plan_id_id", "plan_id", "id"),
+    )
+
+# --- Database Engine Setup ---
+
+def engine_options(url):
+    """Pool settings from config, SQLite (used in local tests) keeps its default pool."""
+    if url.startswith("sqlite"):
+        return {}
+    return dict(
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+    )
+
+def subscription_views_statement(limit=None, after_id=None, customer_id=None, plan_id=None):
+    """
+    One query for a page of subscriptions: customer and plan are joined in
+    (many-to-one), so serializing the page never lazy-loads per row.
+    """
+    statement = select(SubscriptionBase).options(
+        joinedload(SubscriptionBase.customer),
+        joinedload(SubscriptionBase.plan),
+    ).order_by(SubscriptionBase.id)
+    if after_id is not None:
+        statement = statement.where(SubscriptionBase.id > after_id)
+    if limit is not None:
+        statement = statement.limit(limit)
+    if customer_id is not None:
+        statement = statement.where(SubscriptionBase.customer_id == customer_id)
+    if plan_id is not None:
+        statement = statement.where(SubscriptionBase.plan_id == plan_id)
+    return statement
+
+def to_subscription_view(row: SubscriptionBase):
+    return SubscriptionView(
+        id=row.id,
+        start_date=row.start_date,
+        end_date=row.end_date,
+        status=row.status,
+        customer=Customer(id=row.customer.id, name=row.customer.name, email=row.customer.email),
+        plan=PlanSummary(id=row.plan.id, name=row.plan.name, billing_cycle=row.plan.billing_cycle),
+    )
+
+# --- Bulk writes ---
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def new_bulk_report():
+    return {"inserted": 0, "failed": 0, "errors": []}
+
+def record_batch_error(report, rows, error):
+    report["failed"] += len(rows)
+    report["errors"].append({
+        "first_id": rows[0]["id"],
+        "last_id": rows[-1]["id"],
+        "count": len(rows),
+        "error": str(error).splitlines()[0],
+    })
+
+def merge_bulk_reports(report, other):
+    report["inserted"] += other["inserted"]
+    report["failed"] += other["failed"]
+    report["errors"].extend(other["errors"])
+    return report
+
+def customer_rows(customers):
+    return [{"id": c.id, "name": c.name, "email": c.email} for c in customers]
+
+# --- Async Database Engine and Repositories ---
+
+def get_async_sessionmaker(url=config.ASYNC_SQLALCHEMY_DATABASE_URL):
+    """Creates an async engine (no connection is opened yet) and its session factory."""
+    engine = create_async_engine(url, echo=False, **engine_options(url))
+    return async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+async def init_async_db(sessionmaker, seed=True):
+    """Creates the tables and, optionally, resets them to the seed customers and plans."""
+    async with sessionmaker.kw["bind"].begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    if not seed:
+        return
+    async with sessionmaker() as db:
+        await db.execute(delete(SubscriptionBase))
+        await db.execute(delete(CustomerBase))
+        await db.execute(delete(SubscriptionPlanBase))
+        db.add_all([
+            CustomerBase(id=1,name="alfa", email="sample1@gmail.com"),
+            CustomerBase(id=2,name="beta", email="sample2@gmail.com"),
             CustomerBase(id=3,name="gama", email="sample3@gmail.com"),
-            SubscriptionPlanBase(id=1, name="simple", price=20, billing_cycle="monthly"),# to fix
+            SubscriptionPlanBase(id=1, name="simple", price=20, billing_cycle="monthly"),
             SubscriptionPlanBase(id=2, name="ultra", price=40, billing_cycle="yearly")
-        ]
-        
-        db.add_all(items)
-        db.commit()
-        self.db=db
-
-    def get_all(self):
-        result = self.db.query(CustomerBase).all()
-        return result
-
-    def add(self, c:Customer):
-        item = CustomerBase(id=c.id, name=c.name, email=c.email)
-        self.db.add(item)
-        self.db.commit()
-
-    def get_by_id(self):
+        ])
+        await db.commit()
+
+def paginate_statement(model, limit=None, after_id=None):
+    """Applies keyset pagination (ordered by primary key) to a select() of model."""
+    statement = select(model)
+    if limit is None and after_id is None:
+        return statement
+    statement = statement.order_by(model.id)
+    if after_id is not None:
+        statement = statement.where(model.id > after_id)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+class AsyncPostgreSQLCustomerRepository(AsyncRepository):
+    # one short-lived session per operation, so concurrent requests never share a transaction
+    def __init__(self, sessionmaker):
+        self.sessionmaker = sessionmaker
+
+    async def get_all(self, limit=None, after_id=None):
+        async with self.sessionmaker() as db:
+            result = await db.scalars(paginate_statement(CustomerBase, limit, after_id))
+            return result.all()
+
+    async def add(self, c:Customer):
+        async with self.sessionmaker() as db:
+            db.add(CustomerBase(id=c.id, name=c.name, email=c.email))
+            await db.commit()
+
+    async def get_by_id(self, id):
+        async with self.sessionmaker() as db:
+            return await db.get(CustomerBase, id)
+
+    async def add_many(self, customers, batch_size=config.BULK_BATCH_SIZE):
+        """
+        Inserts customers in batches of batch_size, one transaction each: COPY
+        through asyncpg on PostgreSQL, executemany elsewhere (SQLite). A failing
+        batch is rolled back and reported, the following batches are still written.
+        """
+        report = new_bulk_report()
+        async with self.sessionmaker() as db:
+            use_copy = db.get_bind().dialect.name == "postgresql"
+            for batch in chunks(customers, batch_size):
+                rows = customer_rows(batch)
+                try:
+                    if use_copy:
+                        connection = await (await db.connection()).get_raw_connection()
+                        await connection.driver_connection.copy_records_to_table(
+                            "customers",
+                            records=[(x["id"], x["name"], x["email"]) for x in rows],
+                            columns=["id", "name", "email"],
+                        )
+                    else:
+                        await db.execute(insert(CustomerBase), rows)
+                    await db.commit()
+                    report["inserted"] += len(rows)
+                except Exception as e:
+                    await db.rollback()
+                    record_batch_error(report, rows, e)
+        return report
+
+class AsyncPostgreSQLSubscriptionRepository(AsyncRepository):
+    def __init__(self, sessionmaker):
+        self.sessionmaker = sessionmaker
+
+    async def get_all(self, limit=None, after_id=None):
+        async with self.sessionmaker() as db:
+            result = await db.scalars(paginate_statement(SubscriptionBase, limit, after_id))
+            return result.all()
+
+    async def subscribe(self, cid, pid):
+        item = SubscriptionBase(customer_id=cid, plan_id=pid, start_date=date.today(), end_date=date.today(), status=True)
+        async with self.sessionmaker() as db:
+            db.add(item)
+            await db.commit()
+        return item
+
+    async def list_views(self, limit=None, after_id=None, customer_id=None, plan_id=None):
+        async with self.sessionmaker() as db:
+            statement = subscription_views_statement(limit, after_id, customer_id, plan_id)
+            return [to_subscription_view(x) for x in await db.scalars(statement)]
+
+    async def add(self, c:SubscriptionBase):
         pass
 
+    async def get_by_id(self, id):
+        async with self.sessionmaker() as db:
+            return await db.get(SubscriptionBase, id)
 
+get_async_customer_repository = lambda sessionmaker : AsyncPostgreSQLCustomerRepository(sessionmaker)
+get_async_subscription_repository = lambda sessionmaker : AsyncPostgreSQLSubscriptionRepository(sessionmaker)
 
-class PostgreSQLSubscriptionRepository(Repository):
-    def __init__(self):    
-        # Use the generator function to safely get and close the session
-        db_generator = get_db()
-        db = next(db_generator) # Get the session instance
-    
-        # 1. Clear and Add Multiple Items
-        db.query(SubscriptionBase).delete()
-        db.commit()
-
-        self.db=db
-
-    def get_all(self):
-        result = self.db.query(SubscriptionBase).all()
-        return result
-
-    def subscribe(self, cid, pid):
-        from datetime import datetime
-        item = SubscriptionBase(customer_id=cid, plan_id=pid, start_date=datetime.now(), end_date=datetime.now(), status=True)
-        self.db.add(item)
-        self.db.commit()
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from bson.json_util import dumps # Used to correctly serialize ObjectId for printing
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from repository import get_mongo_client
 
-    def add(self, c:SubscriptionBase):
-        pass
+logger = logging.getLogger(__name__)
 
-    def get_by_id(self):
-        pass
-
-get_customer_repository = lambda : PostgreSQLCustomerRepository()
-get_subscription_repository = lambda : PostgreSQLSubscriptionRepository()
+class EventQueueFull(Exception):
+    """Raised by BufferedEventWriter.add when max_queued events are already waiting."""
+    pass
 
-import config 
-from pymongo import MongoClient
-from bson.objectid import ObjectId
-from bson.json_util import dumps # Used to correctly serialize ObjectId for printing
+class BufferedEventWriter:
+    """
+    Write-behind buffer for a Mongo collection. add() only enqueues the
+    document, a background thread writes them with insert_many once
+    batch_size documents are pending or flush_interval seconds have passed
+    since the oldest one. close() writes whatever is left.
+
+    A failed insert is retried up to `retries` times with exponential backoff
+    before the batch is dropped (and logged). At most `max_queued` documents
+    wait in memory: past that add() raises EventQueueFull, so a Mongo outage
+    pushes back on callers instead of growing the buffer without limit.
+    """
+    CALL = object()
+    STOP = object()
+
+    def __init__(self, collection, batch_size=config.EVENT_BATCH_SIZE, flush_interval=config.EVENT_FLUSH_INTERVAL, on_written=None,
+                 max_queued=config.EVENT_MAX_QUEUED, retries=config.EVENT_WRITE_RETRIES, retry_delay=config.EVENT_RETRY_DELAY, max_retry_delay=config.EVENT_MAX_RETRY_DELAY):
+        self.collection = collection
+        self.on_written = on_written
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.queue = queue.Queue(max_queued)
+        self.written = 0
+        self.failed = 0
+        self.closed = False
+        # started by the first add(), so creating a writer has no side effects
+        self.thread = threading.Thread(target=self.run, name="event-writer", daemon=True)
+        self.lock = threading.Lock()
+
+    def add(self, document: dict):
+        # under the lock so no document can slip in behind close()'s STOP
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("event writer is closed")
+            if self.thread.ident is None:
+                self.thread.start()
+            try:
+                self.queue.put_nowait(document)
+            except queue.Full:
+                logger.warning("Event queue full (%d waiting), rejecting event", self.queue.maxsize)
+                raise EventQueueFull(f"{self.queue.maxsize} events are waiting to be written")
+
+    def flush(self):
+        """Blocks until every document added so far has been written."""
+        if self.thread.is_alive():
+            self.call(lambda: None)
+
+    def call(self, function):
+        """
+        Writes what is buffered, then runs function() on the writer thread and
+        returns its result. No batch is written while it runs.
+        """
+        with self.lock:
+            if not self.closed and self.thread.ident is None:
+                self.thread.start()
+        if not self.thread.is_alive():
+            return function()
+        future = Future()
+        self.queue.put((self.CALL, function, future))
+        return future.result()
+
+    def close(self):
+        """Writes what is left and stops the thread, add() raises afterwards."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            started = self.thread.ident is not None
+            if started:
+                self.queue.put(self.STOP)
+        if started:
+            self.thread.join()
+
+    def run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is self.STOP:
+                self.write(batch)
+                return
+            if isinstance(item, tuple) and item[0] is self.CALL:
+                self.write(batch)
+                batch = []
+                _, function, future = item
+                try:
+                    future.set_result(function())
+                except Exception as e:
+                    future.set_exception(e)
+                continue
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self.write(batch)
+                batch = []
+
+    def write(self, batch):
+        if not batch:
+            return
+        attempt = 0
+        while True:
+            try:
+                self.collection.insert_many(batch, ordered=False)
+                break
+            except BulkWriteError as e:
+                # Some documents were rejected, retrying won't help. The rest are
+                # stored and still counted, including duplicate _id errors: those
+                # documents were stored by an attempt that failed after writing.
+                rejected = {x["index"] for x in e.details["writeErrors"] if x["code"] != 11000}
+                if rejected:
+                    self.failed += len(rejected)
+                    logger.error("%d of %d events rejected: %s", len(rejected), len(batch), e)
+                batch = [x for i, x in enumerate(batch) if i not in rejected]
+                break
+            except Exception as e:
+                if attempt >= self.retries:
+                    self.failed += len(batch)
+                    logger.error("Dropping %d events after %d attempts: %s", len(batch), attempt + 1, e)
+                    return
+                delay = min(self.max_retry_delay, self.retry_delay * 2 ** attempt)
+                logger.warning("Writing %d events failed (%s), retrying in %.1fs", len(batch), e, delay)
+                time.sleep(delay)
+                attempt += 1
+        self.written += len(batch)
+        if self.on_written and batch:
+            try:
+                self.on_written(batch)
+            except Exception:
+                logger.exception("Error in on_written callback")
+
+class PaymentStatsRepository:
+    """
+    Payment counters (count, revenue) kept up to date as events are written,
+    one document per key so every stats query is a single _id lookup:
+    plan:<id>, customer:<id>, day:<YYYY-MM-DD>, plan_day:<id>:<YYYY-MM-DD>.
+    Only successful payments (status True) are counted.
+    """
+    DAY_FORMAT = "%Y-%m-%d"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @classmethod
+    def keys(cls, event):
+        day = event["timestamp"].strftime(cls.DAY_FORMAT)
+        return [
+            f"plan:{event['plan_id']}",
+            f"customer:{event['customer_id']}",
+            f"day:{day}",
+            f"plan_day:{event['plan_id']}:{day}",
+        ]
 
-def get_mongo_client():
-    """Establishes and returns a MongoDB client connection."""
-    try:
-        client = MongoClient(config.MONGO_URI)
-        # The ismaster command is a lightweight way to verify a connection
-        client.admin.command('ping')
-        print("MongoDB connection successful!")
-        return client
-    except Exception as e:
-        print(f"Error connecting to MongoDB: {e}")
-        # In a real app, you would raise an exception or handle the error gracefully
-        return None
+    def apply(self, events):
+        """Folds a batch of events into one $inc upsert per touched key."""
+        totals = {}
+        for event in events:
+            if not event["status"]:
+                continue
+            for key in self.keys(event):
+                count, revenue = totals.get(key, (0, 0.0))
+                totals[key] = (count + 1, revenue + event["amount"])
+        if totals:
+            self.collection.bulk_write([
+                UpdateOne({"_id": key}, {"$inc": {"count": count, "revenue": revenue}}, upsert=True)
+                for key, (count, revenue) in totals.items()
+            ], ordered=False)
+
+    def get(self, key):
+        document = self.collection.find_one({"_id": key})
+        return {"count": document["count"], "revenue": document["revenue"]} if document else {"count": 0, "revenue": 0.0}
+
+    def rebuild(self, events_collection):
+        """
+        Recomputes every counter from the raw events (backfills). The counters
+        are aggregated into a temporary collection that is then renamed over
+        the live one, so readers never see missing or half built stats.
+        $inc upserts landing on the live collection while this runs are lost
+        with it: run it through MongoDBEventRepository.rebuild_stats, or with
+        ingestion stopped.
+        """
+        day = {"$dateToString": {"format": self.DAY_FORMAT, "date": "$timestamp"}}
+        groups = {
+            "plan": ["plan:", {"$toString": "$plan_id"}],
+            "customer": ["customer:", {"$toString": "$customer_id"}],
+            "day": ["day:", day],
+            "plan_day": ["plan_day:", {"$toString": "$plan_id"}, ":", day],
+        }
+        building = self.collection.database[f"{self.collection.name}_rebuild"]
+        building.drop()
+        for i, parts in enumerate(groups.values()):
+            # the first group creates the collection, the others add to it (keys never collide)
+            output = {"$out": building.name} if i == 0 else {"$merge": {"into": building.name, "whenMatched": "fail"}}
+            events_collection.aggregate([
+                {"$match": {"customer_id": {"$exists": True}, "status": True}},
+                {"$group": {"_id": {"$concat": parts}, "count": {"$sum": 1}, "revenue": {"$sum": "$amount"}}},
+                output,
+            ])
+        count = building.count_documents({})
+        building.rename(self.collection.name, dropTarget=True)
+        return count
 
 class MongoDBEventRepository(Repository):
     #client
     #collection
     #tasks: List[str]
     
-    def __init__(self):
+    def __init__(self, batch_size=config.EVENT_BATCH_SIZE, flush_interval=config.EVENT_FLUSH_INTERVAL):
         self.client = get_mongo_client()
         if not self.client:
             print("Cannot proceed without a database connection. Please ensure Docker/Db is running.")
@@ -196,10 +516,8 @@ class MongoDBEventRepository(Repository):
 
         self.db = self.client[config.DATABASE_NAME]
         self.collection = self.db[config.COLLECTION_NAME] #use same coll name
-
-        # Clear previous data 
-        self.collection.delete_many({})
-        #print(f"\n--- Cleared all items from '{COLLECTION_NAME}' collection. ---\n")
+        self.stats = PaymentStatsRepository(self.db[config.STATS_COLLECTION_NAME])
+        self.writer = BufferedEventWriter(self.collection, batch_size, flush_interval, on_written=self.stats.apply)
 
         # initial_items = [
         #     {"id":1 ,"name":"My first task", "status":False},
@@ -210,16 +528,29 @@ class MongoDBEventRepository(Repository):
         #print(f"1. Added {len(result_many.inserted_ids)} initial items. IDs: {result_many.inserted_ids}")
     
 
-    def get_all(self):
+    def reset(self):
+        """Clears previous events and stats, done at startup unless seeding is disabled."""
+        self.collection.delete_many({})
+        #print(f"\n--- Cleared all items from '{COLLECTION_NAME}' collection. ---\n")
+        self.stats.collection.delete_many({})
+
+    def get_all(self, limit=None, after_id=None):
         all_items_cursor = self.collection.find()
         # Use dumps to serialize the MongoDB documents (including ObjectIds) to JSON string for readable output
         print(dumps(list(all_items_cursor), indent=2))
         #return [self.custom_serializer(x) for x in all_items_cursor]
     
     def add_event(self, customer_id, plan_id, amount, timestamp, status):
+        # acknowledged once buffered, the writer thread persists it in a batch
         single_item = {"customer_id":customer_id ,"plan_id":plan_id, "amount":amount,"timestamp":timestamp, "status":status}
-        result_one = self.collection.insert_one(single_item)
-        self.get_all()
+        self.writer.add(single_item)
+
+    def rebuild_stats(self):
+        """PaymentStatsRepository.rebuild run on the writer thread, so no event batch is counted while it runs."""
+        return self.writer.call(lambda: self.stats.rebuild(self.collection))
+
+    def close(self):
+        self.writer.close()
 
     def add(self, i: Item):
         pass
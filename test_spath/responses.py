@@ -0,0 +1,35 @@
+"""
+Opt-in fast JSON responses.
+
+FastAPI runs jsonable_encoder over any dict a handler returns, which walks
+every item generically. A handler that returns FastJSONResponse skips that:
+content is encoded by orjson, pydantic models go through their prebuilt core
+serializer and SQLAlchemy rows are read straight from their mapped columns.
+"""
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import inspect
+
+import config
+
+# mapped class -> column attribute names, computed once per class
+orm_columns = {}
+
+def encode_default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.__pydantic_serializer__.to_python(obj)
+    cls = type(obj)
+    if hasattr(cls, "__mapper__"):
+        if cls not in orm_columns:
+            orm_columns[cls] = tuple(x.key for x in inspect(cls).column_attrs)
+        return {key: getattr(obj, key) for key in orm_columns[cls]}
+    raise TypeError(f"Object of type {cls.__name__} is not JSON serializable")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=encode_default)
+
+def respond(content):
+    """Returns content as a FastJSONResponse when config.FAST_JSON_RESPONSES is on."""
+    return FastJSONResponse(content) if config.FAST_JSON_RESPONSES else content
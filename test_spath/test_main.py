@@ -0,0 +1,150 @@
+import asyncio
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+import main
+from repository_t import AsyncPostgreSQLCustomerRepository, EventQueueFull, get_async_sessionmaker, init_async_db
+from test_repository_t import event_repository # fixture
+
+
+@pytest.fixture
+def customers(tmp_path, monkeypatch):
+    # a file database: the app's requests run on the test client's own loop
+    sessionmaker = get_async_sessionmaker(f"sqlite+aiosqlite:///{tmp_path / 'app.db'}")
+
+    async def init():
+        await init_async_db(sessionmaker)
+        await sessionmaker.kw["bind"].dispose()
+    asyncio.run(init())
+    repository = AsyncPostgreSQLCustomerRepository(sessionmaker)
+    monkeypatch.setattr(main, "customer_repository", repository)
+    yield repository
+    asyncio.run(sessionmaker.kw["bind"].dispose())
+
+
+@pytest.fixture
+def client():
+    # no lifespan, bootstrap would connect to the real databases
+    return TestClient(main.app)
+
+
+def customer_ids(repository):
+    return [x.id for x in asyncio.run(repository.get_all())]
+
+
+class TestAddCustomersBulk:
+
+    def test_csv(self, client, customers):
+        body = "id,name,email\n4,delta,sample4@gmail.com\n5,\"epsilon, the fifth\",sample5@gmail.com\n"
+
+        response = client.post("/customers/bulk", content=body, headers={"content-type": "text/csv"})
+
+        assert {"inserted": 2, "failed": 0, "errors": [], "invalid_lines": []} == response.json()
+        assert [1, 2, 3, 4, 5] == customer_ids(customers)
+
+    def test_csv_quoted_newline(self, client, customers):
+        body = "id,name,email\n4,\"two\nlines\",sample4@gmail.com\n5,epsilon,sample5@gmail.com\n"
+
+        response = client.post("/customers/bulk", content=body, headers={"content-type": "text/csv"})
+
+        assert (2, []) == (response.json()["inserted"], response.json()["invalid_lines"])
+        assert "two\nlines" == asyncio.run(customers.get_by_id(4)).name
+
+    def test_ndjson(self, client, customers):
+        body = '{"id": 4, "name": "delta", "email": "sample4@gmail.com"}\n\n{"id": 5, "name": "epsilon", "email": "sample5@gmail.com"}'
+
+        response = client.post("/customers/bulk", content=body)
+
+        assert 2 == response.json()["inserted"]
+        assert [1, 2, 3, 4, 5] == customer_ids(customers)
+
+    def test_invalid_lines(self, client, customers):
+        body = "\n".join([
+            '{"id": 4, "name": "delta", "email": "sample4@gmail.com"}',
+            '{"id": "x", "name": "bad id", "email": "x@gmail.com"}',
+            'not json',
+            '{"id": 5, "name": "epsilon", "email": "sample5@gmail.com"}',
+        ])
+
+        response = client.post("/customers/bulk", content=body)
+
+        assert 2 == response.json()["inserted"]
+        assert [2, 3] == [x["line"] for x in response.json()["invalid_lines"]]
+
+    def test_bad_encoding(self, client, customers):
+        body = b'{"id": 4, "name": "delta", "email": "sample4@gmail.com"}\n{"id": 5, "name": "\xff", "email": "sample5@gmail.com"}\n{"id": 6, "name": "zeta", "email": "sample6@gmail.com"}\n'
+
+        response = client.post("/customers/bulk", content=body)
+
+        assert 200 == response.status_code
+        assert 2 == response.json()["inserted"]
+        assert [2] == [x["line"] for x in response.json()["invalid_lines"]]
+        assert "utf-8" in response.json()["invalid_lines"][0]["error"]
+        assert [1, 2, 3, 4, 6] == customer_ids(customers)
+
+    def test_batch_boundary(self, client, customers, monkeypatch):
+        monkeypatch.setattr(config, "BULK_BATCH_SIZE", 2)
+        batches = []
+        add_many = customers.add_many
+
+        async def counting_add_many(batch):
+            batches.append([x.id for x in batch])
+            return await add_many(batch)
+        monkeypatch.setattr(customers, "add_many", counting_add_many)
+        body = "id,name,email\n" + "".join(f"{i},customer {i},sample{i}@gmail.com\n" for i in [4, 5, 6, 2, 7])
+
+        response = client.post("/customers/bulk", content=body, headers={"content-type": "text/csv"})
+
+        assert [[4, 5], [6, 2], [7]] == batches
+        assert {"inserted": 3, "failed": 2} == {k: response.json()[k] for k in ["inserted", "failed"]}
+        assert [1, 2, 3, 4, 5, 7] == customer_ids(customers)
+
+
+class TestPaymentStats:
+
+    @pytest.fixture(autouse=True)
+    def events(self, event_repository, monkeypatch):
+        monkeypatch.setattr(main, "event_repo", event_repository)
+        return event_repository
+
+    def pay(self, client, customer_id, plan_id, amount):
+        return client.post("/payments/simulate", params={"customer_id": customer_id, "plan_id": plan_id, "amount": amount})
+
+    def test_stats(self, client, events):
+        self.pay(client, 1, 1, 20.0)
+        self.pay(client, 2, 1, 20.0)
+        self.pay(client, 2, 2, 40.0)
+        events.writer.flush()
+        today = date.today().isoformat()
+
+        assert {"key": "plan:1", "count": 2, "revenue": 40.0} == client.get("/payments/stats", params={"plan_id": 1}).json()
+        assert {"key": "customer:2", "count": 2, "revenue": 60.0} == client.get("/payments/stats", params={"customer_id": 2}).json()
+        assert 3 == client.get("/payments/stats", params={"day": today}).json()["count"]
+        assert 1 == client.get("/payments/stats", params={"plan_id": 2, "day": today}).json()["count"]
+        assert 0 == client.get("/payments/stats", params={"plan_id": 3}).json()["count"]
+
+    @pytest.mark.parametrize("params", [{}, {"customer_id": 1, "plan_id": 1}, {"customer_id": 1, "day": "2025-01-01"}])
+    def test_invalid_combination(self, client, params):
+        response = client.get("/payments/stats", params=params)
+
+        assert 400 == response.status_code
+
+    def test_rebuild(self, client, events):
+        self.pay(client, 1, 1, 20.0)
+        events.writer.flush()
+        events.stats.collection.delete_many({})
+
+        response = client.post("/payments/stats/rebuild")
+
+        assert {"counters": 4} == response.json()
+        assert 1 == client.get("/payments/stats", params={"plan_id": 1}).json()["count"]
+
+    def test_queue_full(self, client, events, monkeypatch):
+        def add_event(*args):
+            raise EventQueueFull("2 events are waiting to be written")
+        monkeypatch.setattr(events, "add_event", add_event)
+
+        assert 503 == self.pay(client, 1, 1, 20.0).status_code
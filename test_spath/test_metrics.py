@@ -0,0 +1,117 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from metrics import Metrics, MetricsMiddleware, time_methods, timed
+
+
+class TestMetrics:
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        for value in [0.05, 0.5, 0.5, 5.0]:
+            metrics.observe("latency_seconds", (("route", "/tasks"),), value)
+
+        lines = metrics.render().splitlines()
+
+        assert [
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{route="/tasks",le="0.1"} 1',
+            'latency_seconds_bucket{route="/tasks",le="1.0"} 3',
+            'latency_seconds_bucket{route="/tasks",le="+Inf"} 4',
+            'latency_seconds_sum{route="/tasks"} 6.05',
+            'latency_seconds_count{route="/tasks"} 4',
+        ] == lines
+
+    def test_gauges_and_label_escaping(self):
+        metrics = Metrics()
+        metrics.inc("in_flight", (("route", 'a"b'),), 2)
+        metrics.dec("in_flight", (("route", 'a"b'),))
+
+        assert 'in_flight{route="a\\"b"} 1' == metrics.render().splitlines()[-1]
+
+    def test_empty(self):
+        assert "" == Metrics().render()
+
+
+class Store:
+    def get(self):
+        return 1
+
+    async def aget(self):
+        return 2
+
+    def iter_all(self):
+        yield 3
+
+
+class TestTimeMethods:
+
+    def test_disabled_leaves_class_untouched(self):
+        get = Store.get
+
+        time_methods(Store, enabled=False)
+
+        assert get is Store.__dict__["get"]
+
+    @pytest.mark.asyncio
+    async def test_sync_and_async_methods_are_timed(self):
+        metrics = Metrics()
+        store = Store()
+        store.get = timed(Store.get, metrics).__get__(store)
+        store.aget = timed(Store.aget, metrics).__get__(store)
+
+        assert 1 == store.get()
+        assert 2 == await store.aget()
+
+        assert {
+            ("repository_call_duration_seconds", (("repository", "Store"), ("method", "get"))),
+            ("repository_call_duration_seconds", (("repository", "Store"), ("method", "aget"))),
+        } == set(metrics.histograms)
+
+    def test_only_repository_methods(self):
+        class Listing(Store):
+            def get_all(self):
+                return []
+
+            def build_item(self, row):
+                return row
+
+        time_methods(Listing, enabled=True)
+
+        assert Listing.get_all.__timed__
+        assert not getattr(Listing.build_item, "__timed__", False)
+
+    def test_generators_are_skipped(self):
+        class Generating(Store):
+            def iter_all(self):
+                yield 4
+
+        time_methods(Generating, enabled=True, methods={"iter_all"})
+
+        assert not getattr(Generating.iter_all, "__timed__", False)
+        assert Generating.get is Store.get
+
+
+class TestMetricsMiddleware:
+
+    def test_latency_by_route_template(self):
+        metrics = Metrics()
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware, registry=metrics)
+
+        @app.get("/tasks/{id}")
+        def get_task(id: int):
+            return {"id": id}
+
+        with TestClient(app) as client:
+            client.get("/tasks/1")
+            client.get("/tasks/2")
+            client.get("/missing")
+
+        counts = {labels: x.count for (_, labels), x in metrics.histograms.items()}
+        assert {
+            (("method", "GET"), ("route", "/tasks/{id}"), ("status", 200)): 2,
+            (("method", "GET"), ("route", "unmatched"), ("status", 404)): 1,
+        } == counts
+        assert 0 == metrics.gauges[("http_requests_in_flight", ())]
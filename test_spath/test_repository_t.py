@@ -0,0 +1,284 @@
+import threading
+import time
+from datetime import datetime
+
+import mongomock
+import pytest
+import pytest_asyncio
+from pymongo.errors import AutoReconnect, BulkWriteError
+from sqlalchemy import event
+
+from repository import AsyncCachedRepository, MongoClientRegistry
+from repository_t import Customer, get_async_sessionmaker, init_async_db, AsyncPostgreSQLCustomerRepository, AsyncPostgreSQLSubscriptionRepository, MongoDBEventRepository, BufferedEventWriter, EventQueueFull
+
+
+@pytest_asyncio.fixture
+async def sessionmaker():
+    sessionmaker = get_async_sessionmaker("sqlite+aiosqlite:///:memory:")
+    await init_async_db(sessionmaker)
+    yield sessionmaker
+    await sessionmaker.kw["bind"].dispose()
+
+
+class TestAsyncPostgreSQLCustomerRepository:
+
+    @pytest.mark.asyncio
+    async def test_get_all(self, sessionmaker):
+        repository = AsyncPostgreSQLCustomerRepository(sessionmaker)
+
+        result = await repository.get_all()
+
+        assert ["alfa", "beta", "gama"] == [x.name for x in result]
+
+    @pytest.mark.asyncio
+    async def test_add(self, sessionmaker):
+        repository = AsyncPostgreSQLCustomerRepository(sessionmaker)
+
+        await repository.add(Customer(id=4, name="delta", email="sample4@gmail.com"))
+
+        assert "delta" == (await repository.get_by_id(4)).name
+        assert await repository.get_by_id(99) is None
+        assert [3, 4] == [x.id for x in await repository.get_all(limit=2, after_id=2)]
+
+    @pytest.mark.asyncio
+    async def test_cached(self, sessionmaker):
+        repository = AsyncCachedRepository(AsyncPostgreSQLCustomerRepository(sessionmaker))
+
+        await repository.get_all()
+        await repository.get_all()
+        await repository.add(Customer(id=4, name="delta", email="sample4@gmail.com"))
+
+        assert 4 == len(await repository.get_all())
+        assert {"hits": 1, "misses": 2, "size": 1} == repository.stats()
+
+    @pytest.mark.asyncio
+    async def test_add_many(self, sessionmaker):
+        repository = AsyncPostgreSQLCustomerRepository(sessionmaker)
+        customers = [Customer(id=i, name=f"customer {i}", email=f"sample{i}@gmail.com") for i in [4, 5, 6, 2, 7, 8]]
+
+        report = await repository.add_many(customers, batch_size=2)
+
+        assert 4 == report["inserted"]
+        assert 2 == report["failed"]
+        assert [(6, 2, 2)] == [(x["first_id"], x["last_id"], x["count"]) for x in report["errors"]]
+        assert [1, 2, 3, 4, 5, 7, 8] == [x.id for x in await repository.get_all()]
+
+
+class QueryCounter:
+    """Counts statements sent to the database by an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.increment)
+
+    def increment(self, *args):
+        self.count += 1
+
+
+class TestAsyncPostgreSQLSubscriptionRepository:
+
+    @pytest.mark.asyncio
+    async def test_subscribe(self, sessionmaker):
+        repository = AsyncPostgreSQLSubscriptionRepository(sessionmaker)
+
+        await repository.subscribe(1, 2)
+        await repository.subscribe(3, 1)
+
+        result = await repository.get_all()
+        assert [(1, 2), (3, 1)] == [(x.customer_id, x.plan_id) for x in result]
+
+    @pytest.mark.asyncio
+    async def test_list_views_single_query(self, sessionmaker):
+        repository = AsyncPostgreSQLSubscriptionRepository(sessionmaker)
+        for i in range(30):
+            await repository.subscribe(i % 3 + 1, i % 2 + 1)
+        counter = QueryCounter(sessionmaker.kw["bind"].sync_engine)
+
+        page = await repository.list_views(limit=10, after_id=5)
+
+        assert 1 == counter.count
+        assert list(range(6, 16)) == [x.id for x in page]
+        assert ("gama", "ultra") == (page[0].customer.name, page[0].plan.name)
+
+    @pytest.mark.asyncio
+    async def test_list_views_filters(self, sessionmaker):
+        repository = AsyncPostgreSQLSubscriptionRepository(sessionmaker)
+        for i in range(12):
+            await repository.subscribe(i % 3 + 1, i % 2 + 1)
+
+        by_customer = await repository.list_views(customer_id=2)
+        by_both = await repository.list_views(limit=2, after_id=2, customer_id=2, plan_id=2)
+
+        assert [2, 5, 8, 11] == [x.id for x in by_customer]
+        assert [8] == [x.id for x in by_both]
+
+
+
+@pytest.fixture
+def event_repository(monkeypatch):
+    import repository as repository_module
+    monkeypatch.setattr(repository_module, "MongoClient", mongomock.MongoClient)
+    monkeypatch.setattr(repository_module, "mongo_clients", MongoClientRegistry())
+    repository = MongoDBEventRepository(batch_size=3, flush_interval=60)
+    # mongomock's bulk_write does not accept the UpdateOne of recent pymongo versions
+    stats_collection = repository.stats.collection
+    monkeypatch.setattr(stats_collection, "bulk_write", lambda ops, **kwargs: [
+        stats_collection.update_one(x._filter, x._doc, upsert=x._upsert) for x in ops
+    ])
+    # nor the $merge stage, it is run as the pipeline before it plus an insert
+    aggregate = repository.collection.aggregate
+
+    def aggregate_with_merge(pipeline, **kwargs):
+        if "$merge" not in pipeline[-1]:
+            return aggregate(pipeline, **kwargs)
+        repository.db[pipeline[-1]["$merge"]["into"]].insert_many(list(aggregate(pipeline[:-1], **kwargs)))
+        return iter([])
+    monkeypatch.setattr(repository.collection, "aggregate", aggregate_with_merge)
+    yield repository
+    repository.close()
+
+
+class TestMongoDBEventRepository:
+
+    def test_writes_in_batches(self, event_repository, monkeypatch):
+        batches = []
+        insert_many = event_repository.collection.insert_many
+        monkeypatch.setattr(event_repository.collection, "insert_many", lambda docs, **kwargs: batches.append(len(docs)) or insert_many(docs, **kwargs))
+
+        for i in range(7):
+            event_repository.add_event(1, 2, 10.0 + i, datetime(2025, 1, 1), True)
+        event_repository.writer.flush()
+
+        assert [3, 3, 1] == batches
+        assert 7 == event_repository.collection.count_documents({"customer_id": 1})
+
+    def test_flush_interval(self, event_repository):
+        event_repository.writer.flush_interval = 0.05
+
+        event_repository.add_event(1, 2, 10.0, datetime(2025, 1, 1), True)
+        time.sleep(0.3)
+
+        assert 1 == event_repository.writer.written
+
+    def test_close_writes_pending_events(self, event_repository):
+        event_repository.add_event(1, 2, 10.0, datetime(2025, 1, 1), True)
+
+        event_repository.close()
+
+        assert 1 == event_repository.collection.count_documents({})
+
+    def test_add_after_close_raises(self, event_repository):
+        event_repository.close()
+
+        with pytest.raises(RuntimeError):
+            event_repository.add_event(1, 2, 10.0, datetime(2025, 1, 1), True)
+
+    def test_retries_failed_batch(self, event_repository, monkeypatch):
+        event_repository.writer.retry_delay = 0.01
+        insert_many = event_repository.collection.insert_many
+        failures = [AutoReconnect("connection reset"), AutoReconnect("connection reset")]
+
+        def flaky_insert_many(docs, **kwargs):
+            if failures:
+                raise failures.pop()
+            return insert_many(docs, **kwargs)
+        monkeypatch.setattr(event_repository.collection, "insert_many", flaky_insert_many)
+
+        event_repository.add_event(1, 2, 10.0, datetime(2025, 1, 1), True)
+        event_repository.writer.flush()
+
+        assert (1, 0) == (event_repository.writer.written, event_repository.writer.failed)
+        assert {"count": 1, "revenue": 10.0} == event_repository.stats.get("plan:2")
+
+    def test_drops_batch_after_retries(self, event_repository, monkeypatch):
+        event_repository.writer.retries = 2
+        event_repository.writer.retry_delay = 0.01
+        calls = []
+
+        def failing_insert_many(docs, **kwargs):
+            calls.append(len(docs))
+            raise AutoReconnect("connection refused")
+        monkeypatch.setattr(event_repository.collection, "insert_many", failing_insert_many)
+
+        event_repository.add_event(1, 2, 10.0, datetime(2025, 1, 1), True)
+        event_repository.writer.flush()
+
+        assert [1, 1, 1] == calls
+        assert (0, 1) == (event_repository.writer.written, event_repository.writer.failed)
+
+    def test_bounded_queue(self):
+        writer = BufferedEventWriter(mongomock.MongoClient().db.events, batch_size=10, flush_interval=60, max_queued=2)
+        # a writer thread that never drains the queue, like one stuck on an unreachable server
+        writer.thread = threading.Thread(target=lambda: None)
+        writer.thread.start()
+
+        writer.add({"n": 1})
+        writer.add({"n": 2})
+
+        with pytest.raises(EventQueueFull):
+            writer.add({"n": 3})
+        assert 2 == writer.queue.qsize()
+
+
+class TestPaymentStatsRepository:
+
+    def add_events(self, event_repository):
+        event_repository.add_event(1, 1, 20.0, datetime(2025, 1, 1, 10), True)
+        event_repository.add_event(2, 1, 20.0, datetime(2025, 1, 1, 11), True)
+        event_repository.add_event(2, 2, 40.0, datetime(2025, 1, 2, 9), True)
+        event_repository.add_event(2, 2, 40.0, datetime(2025, 1, 2, 9), False)
+        event_repository.writer.flush()
+
+    def test_incremental_counters(self, event_repository):
+        self.add_events(event_repository)
+        stats = event_repository.stats
+
+        assert {"count": 2, "revenue": 40.0} == stats.get("plan:1")
+        assert {"count": 2, "revenue": 60.0} == stats.get("customer:2")
+        assert {"count": 1, "revenue": 40.0} == stats.get("day:2025-01-02")
+        assert {"count": 2, "revenue": 40.0} == stats.get("plan_day:1:2025-01-01")
+        assert {"count": 1, "revenue": 20.0} == stats.get("customer:1")
+        assert {"count": 0, "revenue": 0.0} == stats.get("plan:3")
+
+    def test_rebuild_matches_incremental(self, event_repository):
+        self.add_events(event_repository)
+        incremental = {x["_id"]: x for x in event_repository.stats.collection.find()}
+        event_repository.collection.insert_one({"id": 1, "name": "a task", "status": True})
+
+        rebuilt = event_repository.stats.rebuild(event_repository.collection)
+
+        assert len(incremental) == rebuilt
+        assert incremental == {x["_id"]: x for x in event_repository.stats.collection.find()}
+        assert "payment_stats_rebuild" not in event_repository.db.list_collection_names()
+
+    def test_rebuild_stats_keeps_concurrent_events(self, event_repository):
+        self.add_events(event_repository)
+        rebuild = event_repository.stats.rebuild
+
+        def rebuild_while_ingesting(events_collection):
+            # an event arriving mid-rebuild waits in the writer until it is done
+            event_repository.add_event(3, 1, 20.0, datetime(2025, 1, 3), True)
+            return rebuild(events_collection)
+        event_repository.stats.rebuild = rebuild_while_ingesting
+
+        event_repository.rebuild_stats()
+        event_repository.writer.flush()
+
+        assert {"count": 3, "revenue": 60.0} == event_repository.stats.get("plan:1")
+        assert {"count": 1, "revenue": 20.0} == event_repository.stats.get("customer:3")
+
+    def test_partially_failed_batch_is_counted(self, event_repository, monkeypatch):
+        insert_many = event_repository.collection.insert_many
+
+        def insert_many_rejecting_second(docs, **kwargs):
+            if len(docs) < 2:
+                return insert_many(docs, **kwargs)
+            insert_many([x for i, x in enumerate(docs) if i != 1], **kwargs)
+            raise BulkWriteError({"nInserted": len(docs) - 1, "writeErrors": [{"index": 1, "code": 121, "errmsg": "Document failed validation"}]})
+        monkeypatch.setattr(event_repository.collection, "insert_many", insert_many_rejecting_second)
+
+        self.add_events(event_repository)
+
+        assert (3, 1) == (event_repository.writer.written, event_repository.writer.failed)
+        assert {"count": 1, "revenue": 20.0} == event_repository.stats.get("plan:1")
+        assert {"count": 1, "revenue": 40.0} == event_repository.stats.get("customer:2")
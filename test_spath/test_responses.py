@@ -0,0 +1,38 @@
+import json
+from datetime import date
+
+from fastapi.encoders import jsonable_encoder
+
+from repository import Task
+from repository_t import Customer, CustomerBase, PlanSummary, SubscriptionBase, SubscriptionView
+from responses import FastJSONResponse
+
+
+def render(content):
+    return json.loads(FastJSONResponse(content).body)
+
+
+class TestFastJSONResponse:
+
+    def test_pydantic_models(self):
+        content = {
+            "tasks": [Task(id=1,name="My first task", status=False)],
+            "subscription": SubscriptionView(
+                id=1, start_date=date(2025, 1, 1), end_date=None, status=True,
+                customer=Customer(id=1, name="alfa", email="sample1@gmail.com"),
+                plan=PlanSummary(id=2, name="ultra", billing_cycle="yearly"),
+            ),
+        }
+
+        assert jsonable_encoder(content) == render(content)
+
+    def test_orm_rows(self):
+        content = {
+            "customers": [CustomerBase(id=1, name="alfa", email="sample1@gmail.com")],
+            "subscriptions": [SubscriptionBase(id=3, customer_id=1, plan_id=2, start_date=date(2025, 1, 1), end_date=None, status=True)],
+        }
+
+        assert {
+            "customers": [{"id": 1, "name": "alfa", "email": "sample1@gmail.com"}],
+            "subscriptions": [{"id": 3, "customer_id": 1, "plan_id": 2, "start_date": "2025-01-01", "end_date": None, "status": True}],
+        } == render(content)
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+# generous, but far below a single database connect timeout
+IMPORT_BUDGET_US = 2_000_000
+
+
+def run_python(*args):
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, timeout=60, check=True,
+    )
+
+
+def cumulative_import_time_us(module):
+    """Cumulative time reported by `python -X importtime` for a top level module."""
+    result = run_python("-X", "importtime", "-c", f"import {module}")
+    for line in result.stderr.splitlines():
+        parts = [x.strip() for x in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise AssertionError(f"{module} not found in importtime output")
+
+
+class TestStartup:
+
+    def test_import_time_budget(self):
+        assert cumulative_import_time_us("main") < IMPORT_BUDGET_US
+
+    def test_import_has_no_side_effects(self):
+        result = run_python("-c", "\n".join([
+            "import main",
+            "print(main.sessionmaker.kw['bind'].sync_engine.pool.checkedin(), main.event_repo.writer.thread.is_alive())",
+        ]))
+
+        assert "0 False" == result.stdout.strip().splitlines()[-1]
+
+    def test_import_does_not_connect_to_mongo(self):
+        result = run_python("-c", "\n".join([
+            "import threading, main",
+            # pymongo monitors the servers from background threads once a client connects
+            "print([x.name for x in threading.enumerate() if x.name.startswith('pymongo')])",
+            "print(sum(x['open'] for x in main.mongo_clients.stats().values()))",
+        ]))
+
+        assert ["[]", "0"] == result.stdout.strip().splitlines()[-2:]